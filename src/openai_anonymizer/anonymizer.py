@@ -1,16 +1,65 @@
-from presidio_analyzer import AnalyzerEngine, Pattern, PatternRecognizer, RecognizerResult
+from presidio_analyzer import AnalyzerEngine, EntityRecognizer, Pattern, PatternRecognizer, RecognizerResult
 from presidio_anonymizer import AnonymizerEngine, EngineResult, OperatorConfig, DeanonymizeEngine
 from presidio_analyzer.nlp_engine import NlpEngineProvider
 from presidio_anonymizer.entities import OperatorResult
-from typing import Dict, Any, List, cast
+from typing import Dict, Any, List, Optional, cast
 
 from .custom_recognizers.randomSecretRecognizer import RandomSecretRecognizer
 from .InstanceCounterAnonymizer import InstanceCounterAnonymizer
 from .InstanceCounterDeanonymizer import InstanceCounterDeanonymizer
+from .scheduler import AnalysisScheduler
+from .selection import AnalysisPlan
+
+# Minimum confidence for an analyzer result to be anonymized (unless the tenant configures another one)
+SCORE_THRESHOLD = 0.6
+
+# Names of the recognizers added by _add_custom_recognizers, which tenant configurations can replace
+CUSTOM_RECOGNIZER_NAMES = frozenset({"UsernameRecognizer", "CustomPhoneRecognizer", "CustomIpRecognizer"})
 
 
 class OpenAIPayloadAnonymizer:
-    def __init__(self):
+    def __init__(
+        self,
+        batch_size: int = 32,
+        n_process: int = 1,
+        analyzer: Optional[AnalyzerEngine] = None,
+        scheduler: Optional[AnalysisScheduler] = None,
+        plan: Optional[AnalysisPlan] = None
+    ):
+        # The analyzer holds no per-request state, so it can be shared between instances
+        self.analyzer = analyzer if analyzer is not None else self.create_analyzer()
+
+        # The recognizers to run (all of them unless an entity allowlist applies)
+        self.plan = plan if plan is not None else AnalysisPlan(self.analyzer)
+
+        # When set, analysis is delegated to the scheduler, which batches texts across requests
+        self.scheduler = scheduler
+
+        # spaCy pipe() settings used when several texts are analyzed together. n_process > 1
+        # starts new processes on every call: only for offline batches, keep it at 1 in the server
+        self.batch_size = batch_size
+        self.n_process = n_process
+
+        self.anonymizerEngine = AnonymizerEngine()
+        self.anonymizerEngine.add_anonymizer( InstanceCounterAnonymizer )
+
+        # Create a mapping between entity types and counters
+        self.entity_mapping = dict[str, int]()
+
+        self.deanonymizer_engine = DeanonymizeEngine()
+
+        self.deanonymizer_engine.add_deanonymizer( InstanceCounterDeanonymizer )
+
+        # Mapping for reversible anonymization
+        self.forward_map: Dict[str, str] = {}
+        self.reverse_map: Dict[str, str] = {}
+
+        # Counters per entity type
+        self.entity_counters: Dict[str, int] = {}
+
+    @staticmethod
+    def create_analyzer(extra_recognizers: Optional[List[EntityRecognizer]] = None) -> AnalyzerEngine:
+        """Build the analyzer engine with the NLP model, all the custom recognizers and extra_recognizers"""
         # NLP setup
         configuration : dict[str, Any] = {
             "nlp_engine_name": "spacy",
@@ -41,38 +90,29 @@ class OpenAIPayloadAnonymizer:
         }
         provider = NlpEngineProvider(nlp_configuration=configuration)
         nlp_engine = provider.create_engine()
-        self.analyzer = AnalyzerEngine(
+        analyzer = AnalyzerEngine(
             nlp_engine=nlp_engine,
             supported_languages=["en","es","it","pl"],  # or whichever languages you actually need
             #deny_list=["CreditCardRecognizer"]  # optional: if you don't need this recognizer
         )
-        self.analyzer.registry.add_recognizer(RandomSecretRecognizer())
+        analyzer.registry.add_recognizer(RandomSecretRecognizer())
 
         # Add custom recognizers for specific PII patterns
-        self._add_custom_recognizers()
-
-        self.anonymizerEngine = AnonymizerEngine()
-        self.anonymizerEngine.add_anonymizer( InstanceCounterAnonymizer )
-
-        # Create a mapping between entity types and counters
-        self.entity_mapping = dict[str, int]()
+        OpenAIPayloadAnonymizer._add_custom_recognizers(analyzer)
 
-        self.deanonymizer_engine = DeanonymizeEngine()
-
-        self.deanonymizer_engine.add_deanonymizer( InstanceCounterDeanonymizer )
+        # e.g. dictionary recognizers for the configured deny-lists
+        for recognizer in extra_recognizers or []:
+            analyzer.registry.add_recognizer(recognizer)
 
-        # Mapping for reversible anonymization
-        self.forward_map: Dict[str, str] = {}
-        self.reverse_map: Dict[str, str] = {}
-
-        # Counters per entity type
-        self.entity_counters: Dict[str, int] = {}
+        return analyzer
 
-    def _add_custom_recognizers(self):
+    @staticmethod
+    def _add_custom_recognizers(analyzer: AnalyzerEngine):
         """Add custom pattern recognizers for specific PII types"""
         custom_recognizers = [
         # Username recognizer (e.g., user123, admin_456)
         PatternRecognizer(
+            name="UsernameRecognizer",
             supported_entity="USERNAME",
             deny_list=[],
             patterns=[
@@ -86,6 +126,7 @@ class OpenAIPayloadAnonymizer:
             supported_language="en"
         ),
         PatternRecognizer(
+            name="CustomPhoneRecognizer",
             supported_entity="PHONE_NUMBER",
             deny_list=[],  # You can add specific numbers to deny if needed
             patterns=[
@@ -108,6 +149,7 @@ class OpenAIPayloadAnonymizer:
         ),
         # IP address recognizer for IPv4 and IPv6
         PatternRecognizer(
+            name="CustomIpRecognizer",
             supported_entity="IP_ADDRESS",
             deny_list=[],
             patterns=[
@@ -128,7 +170,12 @@ class OpenAIPayloadAnonymizer:
         )
         ]
         for recognizer in custom_recognizers:
-            self.analyzer.registry.add_recognizer(recognizer)
+            analyzer.registry.add_recognizer(recognizer)
+
+    @property
+    def score_threshold(self) -> float:
+        """The threshold of the plan (set by the tenant configuration), or the default one"""
+        return self.plan.score_threshold if self.plan.score_threshold is not None else SCORE_THRESHOLD
 
     def _get_label(self, entity_type: str) -> str:
         """Generate sequential anonymized labels like <PERSON_1>"""
@@ -148,8 +195,33 @@ class OpenAIPayloadAnonymizer:
 
     def anonymize_text(self, text: str) -> EngineResult:
         """Anonymize and label PII in text"""
-        analyzer_results : List[RecognizerResult] = self.analyzer.analyze(text=text, language="en", score_threshold=0.6)
+        if self.scheduler is not None:
+            analyzer_results : List[RecognizerResult] = self.scheduler.analyze(text, self.plan)
+        else:
+            analyzer_results = self.plan.analyze(text, score_threshold=self.score_threshold)
+        return self._anonymize_analyzed_text(text, analyzer_results)
+
+    def anonymize_texts(self, texts: List[str]) -> List[EngineResult]:
+        """Anonymize a list of texts, running the NLP analysis as a single batch"""
+        if not texts:
+            return []
+        if self.scheduler is not None:
+            batch_results: List[List[RecognizerResult]] = self.scheduler.analyze_many(texts, self.plan)
+        else:
+            batch_results = self.plan.analyze_batch(
+                texts,
+                batch_size=self.batch_size,
+                n_process=self.n_process,
+                score_threshold=self.score_threshold
+            )
+        # anonymize sequentially so that labels are assigned in order of appearance
+        return [
+            self._anonymize_analyzed_text(text, analyzer_results)
+            for text, analyzer_results in zip(texts, batch_results)
+        ]
 
+    def _anonymize_analyzed_text(self, text: str, analyzer_results: List[RecognizerResult]) -> EngineResult:
+        """Replace the analyzed entities of text with instance counter labels"""
         ordered_values: Dict[str, list[str]] = {}
 
         self.order_entities_in_order_of_appearence(text, analyzer_results, ordered_values)
@@ -202,20 +274,37 @@ class OpenAIPayloadAnonymizer:
         return anonymized_result.text
 
     def anonymize_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Recursively anonymize all string leaf values in a JSON-like payload"""
-        def recursive_anonymize(obj: Any) -> Any:
+        """Anonymize all string leaf values in a JSON-like payload, analyzing them as one batch"""
+        texts: List[str] = []
+        self._collect_strings(payload, texts)
+        anonymized_texts = iter([result.text for result in self.anonymize_texts(texts)])
+
+        def recursive_replace(obj: Any) -> Any:
             if isinstance(obj, dict):
                 obj_dict = cast(dict[Any, Any], obj)
-                return {k: recursive_anonymize(v) for k, v in obj_dict.items()}
+                return {k: recursive_replace(v) for k, v in obj_dict.items()}
             elif isinstance(obj, list):
                 obj_list = cast(list[Any], obj)
-                return [recursive_anonymize(item) for item in obj_list]
+                return [recursive_replace(item) for item in obj_list]
             elif isinstance(obj, str):
-                # Assuming anonymize_text() returns an object with a .text attribute
-                return self.anonymize_text(obj).text
+                # strings are visited in the same order they were collected
+                return next(anonymized_texts)
             else:
                 return obj
-        return recursive_anonymize(payload)
+        return recursive_replace(payload)
+
+    def _collect_strings(self, obj: Any, texts: List[str]) -> None:
+        """Helper to collect string leaf values of dicts/lists in traversal order"""
+        if isinstance(obj, dict):
+            obj_dict = cast(dict[Any, Any], obj)
+            for value in obj_dict.values():
+                self._collect_strings(value, texts)
+        elif isinstance(obj, list):
+            obj_list = cast(list[Any], obj)
+            for item in obj_list:
+                self._collect_strings(item, texts)
+        elif isinstance(obj, str):
+            texts.append(obj)
 
     def deanonymize_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         self._create_reverse_map()
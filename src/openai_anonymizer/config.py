@@ -1,5 +1,6 @@
 import os
 from dotenv import load_dotenv
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -7,9 +8,71 @@ class Settings(BaseSettings):
     openai_api_key: str | None = os.environ.get("HF_TOKEN")
     # openai_api_url: str = "https://api.openai.com/v1/chat/completions"
     openai_api_url: str = "https://router.huggingface.co/v1/chat/completions"
+    openai_embeddings_url: str = "https://router.huggingface.co/v1/embeddings"
+    openai_completions_url: str = "https://router.huggingface.co/v1/completions"
+    # batched analysis: spaCy pipe() batch size (always in process when serving requests)
+    analysis_batch_size: int = 32
+    # micro-batching of analysis across concurrent requests: a batch is run once
+    # scheduler_max_batch_size texts are queued or scheduler_max_wait_ms have elapsed
+    scheduler_enabled: bool = True
+    scheduler_max_batch_size: int = 64
+    scheduler_max_wait_ms: float = 3.0
+    # large deny-lists matched with an Aho-Corasick automaton: entity type -> file with one term per line
+    # e.g. DICTIONARY_FILES='{"CUSTOMER": "/etc/anonymizer/customers.txt"}'
+    dictionary_files: Dict[str, str] = {}
+    dictionary_case_sensitive: bool = False
+    dictionary_normalize_whitespace: bool = True
+    dictionary_reload_interval: float = 5.0
+    # directory where compiled automatons are cached (as JSON), so other workers don't rebuild them;
+    # whoever can write it controls the matched terms, so it must be owned by the service
+    dictionary_cache_dir: str | None = None
     # anonymizer_salt: str = "change-me-in-production"
     server_host: str = "0.0.0.0"
     server_port: int = 8000
+    # entity allowlists: only the recognizers able to produce these entities are run, and the
+    # spaCy pipeline is skipped when none of them is NLP-backed (e.g. only EMAIL_ADDRESS, PHONE_NUMBER).
+    # Selected per request with the X-Anonymizer-Tenant header, and narrowed by X-Anonymizer-Entities.
+    # e.g. TENANT_ENTITIES='{"acme": ["EMAIL_ADDRESS", "PHONE_NUMBER"]}'
+    tenant_entities: Dict[str, List[str]] = {}
+    # allowlist for requests without a configured tenant, None for all entities
+    default_entities: List[str] | None = None
+    # per-tenant recognizers and score threshold: tenant -> YAML/JSON configuration file (see tenants.py),
+    # selected with the X-Anonymizer-Tenant header and reloaded when the file changes
+    # e.g. TENANT_CONFIG_FILES='{"acme": "/etc/anonymizer/tenants/acme.yaml"}'
+    tenant_config_files: Dict[str, str] = {}
+    tenant_config_reload_interval: float = 5.0
+    # compiled tenant registries kept in memory (tenants with identical configurations share one)
+    tenant_registry_cache_size: int = 32
+    # adaptive degradation under overload (see degradation.py): while the mean analysis queue delay
+    # or the process CPU time per second exceed their SLO, requests without X-Anonymizer-Priority: high
+    # step down through degradation_tiers, and step back up once both stayed below
+    # degradation_recovery_ratio times their SLO for degradation_step_up_seconds.
+    # The small_model tier is skipped unless degradation_small_model is set (e.g. en_core_web_sm
+    # when the full tier runs en_core_web_lg)
+    degradation_enabled: bool = False
+    degradation_tiers: List[str] = ["full", "small_model", "patterns"]
+    degradation_small_model: str | None = None
+    degradation_queue_delay_slo_ms: float = 50.0
+    # 1.0 = one core busy for the whole interval
+    degradation_cpu_slo: float = 0.9
+    degradation_recovery_ratio: float = 0.5
+    degradation_step_up_seconds: float = 10.0
+    degradation_interval_seconds: float = 1.0
+    # analyzer snapshot built with `python -m openai_anonymizer.snapshot build PATH`, loaded at boot
+    # instead of building the analyzer (falls back to building it if missing, corrupted or stale: built with
+    # other library versions, recognizer code or DICTIONARY_* settings/files)
+    analyzer_snapshot: str | None = None
+    # preload-and-fork launcher (python -m openai_anonymizer.server)
+    server_workers: int = 2
+    memory_report_interval: float = 60.0
+    # crashed workers are restarted with exponential backoff; the master exits (status 1)
+    # once more than server_max_restarts restarts happen within server_restart_window seconds
+    server_max_restarts: int = 10
+    server_restart_window: float = 60.0
+    # admin endpoints (e.g. /admin/profile) are disabled unless a token is set
+    admin_token: str | None = None
+    profiling_max_seconds: float = 60.0
+    profiling_sample_interval_ms: float = 5.0
 
     # class Config:
     #     env_file = ".env"
@@ -0,0 +1,335 @@
+# pyright: reportUntypedBaseClass=false
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from presidio_analyzer import RecognizerResult, EntityRecognizer
+from presidio_analyzer.nlp_engine import NlpArtifacts
+
+from ..watch import WatchedFile
+
+logger = logging.getLogger(__name__)
+
+
+class AhoCorasickAutomaton:
+    """
+    Aho-Corasick automaton matching every term of a dictionary in a single
+    pass over the text, in time linear in the text length regardless of the
+    number of terms.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        # state 0 is the root; goto[state] maps a character to the next state
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # length of the term ending in a state (0 if none)
+        self.term_length: List[int] = [0]
+        # closest state along the failure chain where a term ends (0 if none)
+        self.output_link: List[int] = [0]
+        self.size = 0
+
+        for term in terms:
+            self._add(term)
+        self._build_links()
+
+    def _add(self, term: str) -> None:
+        if not term:
+            return
+        state = 0
+        for char in term:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.term_length.append(0)
+                self.output_link.append(0)
+            state = next_state
+        if not self.term_length[state]:
+            self.size += 1
+        self.term_length[state] = len(term)
+
+    def _build_links(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                fail_state = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = fail_state
+                self.output_link[next_state] = fail_state if self.term_length[fail_state] else self.output_link[fail_state]
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "goto": self.goto,
+            "fail": self.fail,
+            "term_length": self.term_length,
+            "output_link": self.output_link,
+            "size": self.size,
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, data: str) -> "AhoCorasickAutomaton":
+        """Rebuild an automaton saved with to_json(), raising ValueError if data is not a valid automaton"""
+        state = json.loads(data)
+        if not isinstance(state, dict):
+            raise ValueError("Invalid automaton: not an object")
+        goto, fail, term_length, output_link = (state.get(key) for key in ("goto", "fail", "term_length", "output_link"))
+        if not all(isinstance(table, list) for table in (goto, fail, term_length, output_link)):
+            raise ValueError("Invalid automaton: missing tables")
+        states = len(goto)
+        if not states or not len(fail) == len(term_length) == len(output_link) == states:
+            raise ValueError("Invalid automaton: tables of different lengths")
+        for transitions in goto:
+            if not isinstance(transitions, dict) or not all(
+                isinstance(char, str) and type(next_state) is int and 0 < next_state < states
+                for char, next_state in transitions.items()
+            ):
+                raise ValueError("Invalid automaton: bad transition")
+        for table in (fail, output_link):
+            if not all(type(value) is int and 0 <= value < states for value in table):
+                raise ValueError("Invalid automaton: bad link")
+        if not all(type(value) is int and value >= 0 for value in term_length):
+            raise ValueError("Invalid automaton: bad term length")
+        if type(state.get("size")) is not int:
+            raise ValueError("Invalid automaton: bad size")
+
+        automaton = cls.__new__(cls)
+        automaton.goto = goto
+        automaton.fail = fail
+        automaton.term_length = term_length
+        automaton.output_link = output_link
+        automaton.size = state["size"]
+        return automaton
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) of every occurrence of a term in text, overlapping ones included"""
+        goto = self.goto
+        fail = self.fail
+        term_length = self.term_length
+        output_link = self.output_link
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            match_state = state if term_length[state] else output_link[state]
+            while match_state:
+                end = index + 1
+                yield end - term_length[match_state], end
+                match_state = output_link[match_state]
+
+
+class _NormalizedText:
+    """Normalized copy of a text, keeping track of the original offset of each character"""
+
+    def __init__(self, text: str, case_sensitive: bool, normalize_whitespace: bool):
+        if not normalize_whitespace:
+            lowered = text if case_sensitive else text.lower()
+            if len(lowered) == len(text):
+                # fast path: offsets are unchanged
+                self.text = lowered
+                self.offsets: Optional[List[int]] = None
+                return
+
+        chars: List[str] = []
+        offsets: List[int] = []
+        previous_is_space = False
+        for index, char in enumerate(text):
+            if normalize_whitespace and char.isspace():
+                if previous_is_space:
+                    continue
+                char = " "
+                previous_is_space = True
+            else:
+                previous_is_space = False
+                if not case_sensitive:
+                    lowered = char.lower()
+                    # keep characters whose lower case has a different length (e.g. "İ")
+                    char = lowered if len(lowered) == 1 else char
+            chars.append(char)
+            offsets.append(index)
+        self.text = "".join(chars)
+        self.offsets = offsets
+
+    def original_span(self, start: int, end: int) -> Tuple[int, int]:
+        if self.offsets is None:
+            return start, end
+        return self.offsets[start], self.offsets[end - 1] + 1
+
+
+def normalize_term(term: str, case_sensitive: bool = False, normalize_whitespace: bool = True) -> str:
+    """Normalize a dictionary term the same way the analyzed text is normalized"""
+    term = term.strip()
+    return _NormalizedText(term, case_sensitive, normalize_whitespace).text
+
+
+def read_terms(path: str) -> List[str]:
+    """Read one term per line, skipping empty lines and lines starting with #"""
+    with open(path, encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip() and not line.lstrip().startswith("#")]
+
+
+# Automatons are cached per process by file identity and normalization options, so that
+# recognizers for the same file share one automaton (and a forked worker inherits it).
+_automaton_cache: Dict[Tuple[str, int, int, bool, bool], AhoCorasickAutomaton] = {}
+_automaton_cache_lock = threading.Lock()
+
+
+def load_automaton(
+    path: str,
+    case_sensitive: bool = False,
+    normalize_whitespace: bool = True,
+    cache_dir: Optional[str] = None
+) -> AhoCorasickAutomaton:
+    """
+    Build (or fetch from cache) the automaton for the terms listed in path.
+
+    When cache_dir is given, built automatons are also saved there as JSON, keyed by
+    the hash of the file content and the options, so other processes can load them
+    instead of building them again. Unlike pickle, loading JSON cannot run code, and
+    an invalid cache file is rebuilt; still, whoever can write cache_dir decides which
+    terms are matched, so it must be owned by the service and not writable by others.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, case_sensitive, normalize_whitespace)
+    with _automaton_cache_lock:
+        automaton = _automaton_cache.get(key)
+        if automaton is not None:
+            return automaton
+
+        with open(path, "rb") as file:
+            content = file.read()
+        cache_path = None
+        if cache_dir is not None:
+            digest = hashlib.sha256(content + f"|{case_sensitive}|{normalize_whitespace}".encode()).hexdigest()
+            cache_path = os.path.join(cache_dir, f"{digest}.automaton.json")
+            if os.path.exists(cache_path):
+                try:
+                    with open(cache_path, encoding="utf-8") as file:
+                        automaton = AhoCorasickAutomaton.from_json(file.read())
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignoring invalid automaton cache file {cache_path}: {e}")
+
+        if automaton is None:
+            terms = read_terms(path)
+            automaton = AhoCorasickAutomaton(normalize_term(term, case_sensitive, normalize_whitespace) for term in terms)
+            if cache_path is not None:
+                os.makedirs(cache_dir, exist_ok=True)  # type: ignore[arg-type]
+                temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(temporary_path, "w", encoding="utf-8") as file:
+                    file.write(automaton.to_json())
+                os.replace(temporary_path, cache_path)
+
+        # drop automatons built from previous versions of the same file
+        for stale_key in [k for k in _automaton_cache if k[0] == key[0] and k[3:] == key[3:]]:
+            del _automaton_cache[stale_key]
+        _automaton_cache[key] = automaton
+        return automaton
+
+
+class DictionaryRecognizer(EntityRecognizer):
+    """
+    Recognizer for large deny-lists (customer names, codenames, account ids...).
+
+    Unlike PatternRecognizer(deny_list=...), which compiles the list into one
+    regex alternation, terms are matched with an Aho-Corasick automaton. Terms
+    are given directly or loaded from a file (one term per line), which is
+    checked for changes every reload_interval seconds. A changed file is
+    rebuilt on a background thread and swapped in once built (see WatchedFile),
+    so analysis (possibly a single scheduler thread) never waits for it. Matches
+    must start and end on word boundaries.
+    """
+
+    def __init__(
+        self,
+        supported_entity: str,
+        terms: Optional[List[str]] = None,
+        path: Optional[str] = None,
+        case_sensitive: bool = False,
+        normalize_whitespace: bool = True,
+        score: float = 1.0,
+        reload_interval: float = 5.0,
+        cache_dir: Optional[str] = None,
+        context: Optional[List[str]] = None,
+        name: Optional[str] = None,
+        supported_language: str = "en"
+    ):
+        if (terms is None) == (path is None):
+            raise ValueError("Exactly one of terms or path must be provided.")
+        super().__init__(
+            supported_entities=[supported_entity],
+            name=name or f"DictionaryRecognizer_{supported_entity}",
+            supported_language=supported_language,
+            context=context
+        )
+        self.path = path
+        self.case_sensitive = case_sensitive
+        self.normalize_whitespace = normalize_whitespace
+        self.score = score
+        self.cache_dir = cache_dir
+
+        self.terms_file: Optional[WatchedFile[AhoCorasickAutomaton]] = None
+        if terms is not None:
+            self._automaton = AhoCorasickAutomaton(
+                normalize_term(term, case_sensitive, normalize_whitespace) for term in terms
+            )
+        else:
+            self.terms_file = WatchedFile(
+                path,  # type: ignore[arg-type]
+                functools.partial(
+                    load_automaton,
+                    case_sensitive=case_sensitive,
+                    normalize_whitespace=normalize_whitespace,
+                    cache_dir=cache_dir
+                ),
+                reload_interval
+            )
+            if self.terms_file.value is None:
+                raise self.terms_file.error  # type: ignore[misc]
+
+    def load(self) -> None:
+        # terms are loaded in __init__ and reloaded by terms_file
+        pass
+
+    @property
+    def automaton(self) -> AhoCorasickAutomaton:
+        """The automaton currently matched, without checking the terms file"""
+        if self.terms_file is not None:
+            return self.terms_file.value  # type: ignore[return-value]
+        return self._automaton
+
+    def analyze(self, text: str, entities: List[str], nlp_artifacts: Optional[NlpArtifacts] = None) -> List[RecognizerResult]:
+        automaton = self.terms_file.get() if self.terms_file is not None else self._automaton
+        normalized = _NormalizedText(text, self.case_sensitive, self.normalize_whitespace)
+        entity_type = self.supported_entities[0]
+        results: List[RecognizerResult] = []
+        for start, end in automaton.iter_matches(normalized.text):
+            start, end = normalized.original_span(start, end)
+            if self._is_word_boundary(text, start - 1) and self._is_word_boundary(text, end):
+                results.append(
+                    RecognizerResult(
+                        entity_type=entity_type,
+                        start=start,
+                        end=end,
+                        score=self.score
+                    )
+                )
+        return results
+
+    @staticmethod
+    def _is_word_boundary(text: str, index: int) -> bool:
+        if index < 0 or index >= len(text):
+            return True
+        char = text[index]
+        return not (char.isalnum() or char == "_")
@@ -0,0 +1,190 @@
+"""
+Adaptive degradation of the analysis under overload.
+
+The controller measures, over windows of `interval_seconds`, the mean delay
+texts wait before being analyzed (in the scheduler queue, or for a worker
+thread) and the CPU time used by the process per wall clock second. The CPU
+time is time.process_time(): all the threads of this process, not the other
+workers nor the rest of the container or host. While one of them exceeds its
+SLO the controller steps down one tier per window:
+
+    full         the configured spaCy model and all the recognizers
+    small_model  the same recognizers with a smaller spaCy model
+    patterns     only the recognizers that do not need the spaCy pipeline
+
+It steps back up one tier once both signals have stayed below `recovery_ratio`
+times their SLO for `step_up_seconds` (hysteresis, so that it does not flap
+around the threshold). High priority requests always run the first tier.
+"""
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from presidio_analyzer import AnalyzerEngine
+    from presidio_analyzer.nlp_engine import NlpEngine
+    from .selection import AnalysisPlan
+
+logger = logging.getLogger(__name__)
+
+FULL = "full"
+SMALL_MODEL = "small_model"
+PATTERNS = "patterns"
+TIERS = [FULL, SMALL_MODEL, PATTERNS]
+
+HIGH_PRIORITY = "high"
+
+
+def create_small_nlp_engine(analyzer: "AnalyzerEngine", model_name: str) -> "NlpEngine":
+    """Load model_name for the languages of the analyzer's spaCy engine, with the same entity mapping"""
+    from presidio_analyzer.nlp_engine import SpacyNlpEngine
+
+    nlp_engine = analyzer.nlp_engine
+    nlp_engine_small = SpacyNlpEngine(
+        models=[{"lang_code": lang_code, "model_name": model_name} for lang_code in nlp_engine.get_supported_languages()],
+        ner_model_configuration=nlp_engine.ner_model_configuration  # type: ignore[attr-defined]
+    )
+    nlp_engine_small.load()
+    return nlp_engine_small
+
+
+class DegradationController:
+    """Load-aware choice of the analysis tier of each request, see the module docstring"""
+
+    def __init__(
+        self,
+        tiers: List[str],
+        queue_delay_slo_ms: float = 50.0,
+        cpu_slo: float = 0.9,
+        recovery_ratio: float = 0.5,
+        step_up_seconds: float = 10.0,
+        interval_seconds: float = 1.0,
+        small_nlp_engine: Optional["NlpEngine"] = None,
+        clock: Callable[[], float] = time.monotonic,
+        cpu_clock: Callable[[], float] = time.process_time
+    ):
+        unknown_tiers = [tier for tier in tiers if tier not in TIERS]
+        if not tiers or unknown_tiers or len(set(tiers)) != len(tiers):
+            raise ValueError(f"tiers must be distinct values among {TIERS}, got {tiers}")
+        if SMALL_MODEL in tiers and small_nlp_engine is None:
+            raise ValueError(f"The {SMALL_MODEL} tier requires a small NLP engine")
+        if not 0 < recovery_ratio < 1:
+            raise ValueError("recovery_ratio must be between 0 and 1")
+
+        self.tiers = list(tiers)
+        self.queue_delay_slo_seconds = queue_delay_slo_ms / 1000.0
+        self.cpu_slo = cpu_slo
+        self.recovery_ratio = recovery_ratio
+        self.step_up_seconds = step_up_seconds
+        self.interval_seconds = interval_seconds
+        self.small_nlp_engine = small_nlp_engine
+        self._clock = clock
+        self._cpu_clock = cpu_clock
+
+        self._lock = threading.Lock()
+        self.level = 0
+        self._window_started_at = clock()
+        self._window_cpu = cpu_clock()
+        self._queue_delay_sum = 0.0
+        self._queue_delay_count = 0
+        self._calm_since: Optional[float] = None
+
+        self.last_queue_delay_seconds = 0.0
+        self.last_cpu = 0.0
+        self.step_downs = 0
+        self.step_ups = 0
+        self.requests_per_tier = {tier: 0 for tier in TIERS}
+
+    @property
+    def tier(self) -> str:
+        return self.tiers[self.level]
+
+    def record_queue_delays(self, queue_delays: Iterable[float]) -> None:
+        delays = list(queue_delays)
+        with self._lock:
+            self._queue_delay_sum += sum(delays)
+            self._queue_delay_count += len(delays)
+
+    def apply(self, plan: "AnalysisPlan", priority: Optional[str] = None) -> Tuple["AnalysisPlan", str]:
+        """
+        The variant of plan to run for a request of this priority, and the tier it runs at:
+        a tier that cannot apply to the plan (patterns when all its recognizers need the spaCy
+        pipeline) falls back to the next better one.
+        """
+        self._evaluate_if_due()
+        tier = self.tiers[0] if priority is not None and priority.lower() == HIGH_PRIORITY else self.tier
+        if tier == PATTERNS:
+            patterns_plan = plan.without_nlp()
+            if patterns_plan is not None:
+                return self._count(patterns_plan, PATTERNS)
+            tier = SMALL_MODEL
+        if tier == SMALL_MODEL and self.small_nlp_engine is not None:
+            return self._count(plan.with_nlp_engine(self.small_nlp_engine), SMALL_MODEL)
+        return self._count(plan, FULL)
+
+    def _count(self, plan: "AnalysisPlan", tier: str) -> Tuple["AnalysisPlan", str]:
+        with self._lock:
+            self.requests_per_tier[tier] += 1
+        return plan, tier
+
+    def _evaluate_if_due(self) -> None:
+        now = self._clock()
+        if now - self._window_started_at < self.interval_seconds:
+            return
+        with self._lock:
+            window_started_at = self._window_started_at
+            elapsed = now - window_started_at
+            if elapsed < self.interval_seconds:
+                return
+            cpu = self._cpu_clock()
+            self.last_cpu = (cpu - self._window_cpu) / elapsed
+            self.last_queue_delay_seconds = self._queue_delay_sum / self._queue_delay_count if self._queue_delay_count else 0.0
+            self._window_started_at = now
+            self._window_cpu = cpu
+            self._queue_delay_sum = 0.0
+            self._queue_delay_count = 0
+            self._update(window_started_at, now)
+
+    def _update(self, window_started_at: float, now: float) -> None:
+        overloaded = self.last_queue_delay_seconds > self.queue_delay_slo_seconds or self.last_cpu > self.cpu_slo
+        calm = (
+            self.last_queue_delay_seconds <= self.queue_delay_slo_seconds * self.recovery_ratio
+            and self.last_cpu <= self.cpu_slo * self.recovery_ratio
+        )
+        if overloaded:
+            self._calm_since = None
+            if self.level < len(self.tiers) - 1:
+                self.level += 1
+                self.step_downs += 1
+                logger.warning(
+                    f"Overloaded (queue delay {self.last_queue_delay_seconds * 1000:.1f} ms, cpu {self.last_cpu:.2f}), "
+                    f"analyzing at the {self.tier} tier"
+                )
+        elif calm:
+            # a window without requests counts as calm from its start
+            if self._calm_since is None:
+                self._calm_since = window_started_at
+            if self.level > 0 and now - self._calm_since >= self.step_up_seconds:
+                self.level -= 1
+                self.step_ups += 1
+                self._calm_since = now
+                logger.info(f"Load recovered, analyzing at the {self.tier} tier")
+        else:
+            # between the recovery threshold and the SLO: hold the current tier
+            self._calm_since = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current values as a JSON serializable dict"""
+        with self._lock:
+            return {
+                "tier": self.tier,
+                "tiers": list(self.tiers),
+                "queue_delay_slo_seconds": self.queue_delay_slo_seconds,
+                "cpu_slo": self.cpu_slo,
+                "last_queue_delay_seconds": self.last_queue_delay_seconds,
+                "last_cpu": self.last_cpu,
+                "step_downs": self.step_downs,
+                "step_ups": self.step_ups,
+                "requests_per_tier": dict(self.requests_per_tier),
+            }
@@ -1,61 +1,439 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response
 import httpx
-from anonymizer import OpenAIPayloadAnonymizer
-from config import settings
-from schemas import OpenAIRequest
+import pickle
+import secrets
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, List, Optional, Tuple
+from .profiling import profiler, ProfilingMiddleware, ProfilingSession
+from .config import settings
+from .schemas import OpenAIRequest, EmbeddingRequest, CompletionRequest
 import logging
 
+# presidio and spaCy take seconds to import: they are imported on first use
+# (the first request, or the preload of the launcher), not when the app is imported
+if TYPE_CHECKING:
+    from presidio_analyzer import AnalyzerEngine
+    from .anonymizer import OpenAIPayloadAnonymizer
+    from .degradation import DegradationController
+    from .scheduler import AnalysisScheduler
+    from .selection import AnalysisPlan, RecognizerSelector
+    from .tenants import TenantRegistryCache
+    from .custom_recognizers.dictionaryRecognizer import DictionaryRecognizer
+
 app = FastAPI(title="OpenAI API Anonymizer")
+app.add_middleware(ProfilingMiddleware)
 logger = logging.getLogger(__name__)
 
+# Only the text fields are anonymized for these endpoints: model names such as
+# "text-embedding-3-small" would otherwise be picked up as secrets
+EMBEDDING_TEXT_FIELDS = ["input", "user"]
+COMPLETION_TEXT_FIELDS = ["prompt", "suffix", "user"]
+
+# Response header reporting the analysis tier a request ran at (see degradation.py)
+TIER_HEADER = "X-Anonymizer-Tier"
+
+
+# The analyzer (NLP model + recognizers) and the scheduler are shared by all requests,
+# while each request gets its own OpenAIPayloadAnonymizer holding its entity mapping
+_analyzer: Optional["AnalyzerEngine"] = None
+_scheduler: Optional["AnalysisScheduler"] = None
+_selector: Optional["RecognizerSelector"] = None
+_tenant_registries: Optional["TenantRegistryCache"] = None
+_degradation: Optional["DegradationController"] = None
+_engine_lock = threading.Lock()
+
+
+def _create_dictionary_recognizers() -> List["DictionaryRecognizer"]:
+    from .custom_recognizers.dictionaryRecognizer import DictionaryRecognizer
+    return [
+        DictionaryRecognizer(
+            supported_entity=entity_type,
+            path=path,
+            case_sensitive=settings.dictionary_case_sensitive,
+            normalize_whitespace=settings.dictionary_normalize_whitespace,
+            reload_interval=settings.dictionary_reload_interval,
+            cache_dir=settings.dictionary_cache_dir
+        )
+        for entity_type, path in settings.dictionary_files.items()
+    ]
+
+
+def build_analyzer() -> "AnalyzerEngine":
+    """Build the analyzer from the settings, without using the snapshot"""
+    from .anonymizer import OpenAIPayloadAnonymizer
+    return OpenAIPayloadAnonymizer.create_analyzer(extra_recognizers=_create_dictionary_recognizers())
+
+
+def _load_analyzer() -> "AnalyzerEngine":
+    if settings.analyzer_snapshot:
+        from .snapshot import load_snapshot
+        try:
+            return load_snapshot(settings.analyzer_snapshot)
+        # unpickling can also fail with EOFError, or with AttributeError/ImportError for renamed classes
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            logger.warning(f"Cannot load analyzer snapshot {settings.analyzer_snapshot}, building the analyzer: {e}")
+    return build_analyzer()
+
+
+def get_analyzer() -> "AnalyzerEngine":
+    global _analyzer
+    with _engine_lock:
+        if _analyzer is None:
+            _analyzer = _load_analyzer()
+        return _analyzer
+
+
+def get_scheduler() -> Optional["AnalysisScheduler"]:
+    global _scheduler
+    if not settings.scheduler_enabled:
+        return None
+    from .anonymizer import SCORE_THRESHOLD
+    from .scheduler import AnalysisScheduler
+    analyzer = get_analyzer()
+    degradation = get_degradation()
+    with _engine_lock:
+        if _scheduler is None:
+            _scheduler = AnalysisScheduler(
+                analyzer,
+                max_batch_size=settings.scheduler_max_batch_size,
+                max_wait_ms=settings.scheduler_max_wait_ms,
+                nlp_batch_size=settings.analysis_batch_size,
+                score_threshold=SCORE_THRESHOLD,
+                queue_delay_observer=degradation.record_queue_delays if degradation is not None else None
+            )
+        return _scheduler
+
+
+def get_degradation() -> Optional["DegradationController"]:
+    global _degradation
+    if not settings.degradation_enabled:
+        return None
+    from .degradation import SMALL_MODEL, DegradationController, create_small_nlp_engine
+    analyzer = get_analyzer()
+    with _engine_lock:
+        if _degradation is None:
+            tiers = settings.degradation_tiers
+            small_nlp_engine = None
+            if SMALL_MODEL in tiers and settings.degradation_small_model:
+                small_nlp_engine = create_small_nlp_engine(analyzer, settings.degradation_small_model)
+            elif SMALL_MODEL in tiers:
+                # no smaller model configured: step down from the full model directly to patterns
+                tiers = [tier for tier in tiers if tier != SMALL_MODEL]
+            _degradation = DegradationController(
+                tiers,
+                queue_delay_slo_ms=settings.degradation_queue_delay_slo_ms,
+                cpu_slo=settings.degradation_cpu_slo,
+                recovery_ratio=settings.degradation_recovery_ratio,
+                step_up_seconds=settings.degradation_step_up_seconds,
+                interval_seconds=settings.degradation_interval_seconds,
+                small_nlp_engine=small_nlp_engine
+            )
+        return _degradation
+
+
+def get_selector() -> "RecognizerSelector":
+    global _selector
+    from .selection import RecognizerSelector
+    analyzer = get_analyzer()
+    with _engine_lock:
+        if _selector is None:
+            _selector = RecognizerSelector(analyzer)
+            # precompute the plans of the configured tenants
+            for entities in settings.tenant_entities.values():
+                _selector.plan(entities)
+        return _selector
+
+
+def get_tenant_registries() -> "TenantRegistryCache":
+    global _tenant_registries
+    from .tenants import TenantRegistryCache
+    analyzer = get_analyzer()
+    with _engine_lock:
+        if _tenant_registries is None:
+            _tenant_registries = TenantRegistryCache(
+                analyzer,
+                settings.tenant_config_files,
+                max_registries=settings.tenant_registry_cache_size,
+                reload_interval=settings.tenant_config_reload_interval
+            )
+            # precompute the plans of the configured tenant allowlists (invalid files are logged by the cache)
+            invalid_tenants = _tenant_registries.invalid_tenants()
+            for tenant in settings.tenant_config_files:
+                registry = _tenant_registries.get(tenant) if tenant not in invalid_tenants else None
+                if registry is not None and tenant in settings.tenant_entities:
+                    registry.selector.plan(settings.tenant_entities[tenant])
+        return _tenant_registries
+
+
+def _resolve_entities(tenant: Optional[str], requested: Optional[str]) -> Optional[FrozenSet[str]]:
+    """
+    Entities to anonymize: the tenant allowlist (or the default one for unknown tenants),
+    narrowed by the entities requested in the X-Anonymizer-Entities header. None means all.
+    """
+    from .selection import parse_entities
+    allowed = settings.tenant_entities.get(tenant, settings.default_entities) if tenant else settings.default_entities
+    allowed_entities = frozenset(allowed) if allowed is not None else None
+    requested_entities = parse_entities(requested)
+    if requested_entities is None:
+        return allowed_entities
+    if allowed_entities is None:
+        return requested_entities
+    entities = allowed_entities & requested_entities
+    if not entities:
+        raise HTTPException(status_code=400, detail="None of the requested entities is allowed for this tenant")
+    return entities
+
+
+def _resolve_plan(tenant: Optional[str], requested: Optional[str], priority: Optional[str]) -> Tuple["AnalysisPlan", str]:
+    """The plan to analyze the request with, and its tier (cheaper than full under overload)"""
+    from .degradation import FULL
+    from .tenants import TenantConfigurationError
+    entities = _resolve_entities(tenant, requested)
+    # tenants with a configuration file analyze with their own compiled registry
+    try:
+        registry = get_tenant_registries().get(tenant)
+    except TenantConfigurationError:
+        # never fall back to the shared registry, which lacks the tenant's recognizers
+        raise HTTPException(status_code=503, detail=f"The configuration of tenant {tenant} is invalid")
+    selector = registry.selector if registry is not None else get_selector()
+    try:
+        plan = selector.plan(entities)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    degradation = get_degradation()
+    if degradation is None:
+        return plan, FULL
+    return degradation.apply(plan, priority)
+
+
+def _create_anonymizer(plan: "AnalysisPlan") -> "OpenAIPayloadAnonymizer":
+    from .anonymizer import OpenAIPayloadAnonymizer
+    return OpenAIPayloadAnonymizer(
+        batch_size=settings.analysis_batch_size,
+        analyzer=get_analyzer(),
+        scheduler=get_scheduler(),
+        plan=plan
+    )
+
+
+async def _anonymize(anonymizer: "OpenAIPayloadAnonymizer", payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Anonymize payload in a worker thread, reporting how long it waited for one to the overload controller"""
+    degradation = _degradation
+    if degradation is None:
+        return await run_in_threadpool(profiler.call, "anonymize_payload", anonymizer.anonymize_payload, payload)
+    submitted_at = time.perf_counter()
+
+    def anonymize() -> Dict[str, Any]:
+        degradation.record_queue_delays([time.perf_counter() - submitted_at])
+        return profiler.call("anonymize_payload", anonymizer.anonymize_payload, payload)
+
+    return await run_in_threadpool(anonymize)
+
+
+async def _anonymize_fields(anonymizer: "OpenAIPayloadAnonymizer", payload: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Anonymize the given top level fields of payload as one batch, leaving the others untouched"""
+    text_fields = {field: payload[field] for field in fields if field in payload}
+    anonymized_fields = await _anonymize(anonymizer, text_fields)
+    return {**payload, **anonymized_fields}
+
+
+async def _forward(url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Send an anonymized request to the OpenAI-compatible API and return its JSON response"""
+    async with httpx.AsyncClient() as client:
+        headers = {
+            "Authorization": f"Bearer {settings.openai_api_key}",
+            "Content-Type": "application/json"
+        }
+        response = await client.post(
+            url,
+            json=payload,
+            headers=headers,
+            timeout=30.0
+        )
+
+    if response.status_code != 200:
+        logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
+        raise HTTPException(
+            status_code=response.status_code,
+            detail="Error from OpenAI API"
+        )
+
+    return response.json()
+
+
 @app.post("/v1/chat/completions")
-async def proxy_openai(request: OpenAIRequest):
+async def proxy_openai(
+    request: OpenAIRequest,
+    response: Response,
+    x_anonymizer_tenant: Optional[str] = Header(None),
+    x_anonymizer_entities: Optional[str] = Header(None),
+    x_anonymizer_priority: Optional[str] = Header(None)
+):
+    plan, tier = await run_in_threadpool(_resolve_plan, x_anonymizer_tenant, x_anonymizer_entities, x_anonymizer_priority)
+    response.headers[TIER_HEADER] = tier
     try:
         # Use same instance for both anonymize + deanonymize
-        anonymizer = OpenAIPayloadAnonymizer()
-        
+        anonymizer = await run_in_threadpool(_create_anonymizer, plan)
+
         # Convert Pydantic model to dict for processing
         payload = request.model_dump(exclude_unset=True)
-        
-        # Anonymize input
-        anonymized_payload = anonymizer.anonymize_payload(payload)
+
+        # Anonymize input (in a worker thread, so that concurrent requests can be batched together)
+        anonymized_payload = await _anonymize(anonymizer, payload)
         logger.debug(f"Anonymized payload: {anonymized_payload}")
-        
-        # Send anonymized request to OpenAI-compatible API
-        async with httpx.AsyncClient() as client:
-            headers = {
-                "Authorization": f"Bearer {settings.openai_api_key}",
-                "Content-Type": "application/json"
-            }
-            response = await client.post(
-                settings.openai_api_url,
-                json=anonymized_payload,
-                headers=headers,
-                timeout=30.0
-            )
-        
-        if response.status_code != 200:
-            logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
-            raise HTTPException(
-                status_code=response.status_code,
-                detail="Error from OpenAI API"
-            )
-        
+
+        openai_response = await _forward(settings.openai_api_url, anonymized_payload)
+
         # Deanonymize output
-        openai_response = response.json()
-        deanonymized_response = anonymizer.deanonymize_payload(openai_response)
+        deanonymized_response = await run_in_threadpool(
+            profiler.call, "deanonymize_payload", anonymizer.deanonymize_payload, openai_response
+        )
+        logger.debug(f"Deanonymized response: {deanonymized_response}")
+
+        return deanonymized_response
+
+    except Exception as e:
+        logger.exception("Error processing request")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/v1/embeddings")
+async def proxy_embeddings(
+    request: EmbeddingRequest,
+    response: Response,
+    x_anonymizer_tenant: Optional[str] = Header(None),
+    x_anonymizer_entities: Optional[str] = Header(None),
+    x_anonymizer_priority: Optional[str] = Header(None)
+):
+    plan, tier = await run_in_threadpool(_resolve_plan, x_anonymizer_tenant, x_anonymizer_entities, x_anonymizer_priority)
+    response.headers[TIER_HEADER] = tier
+    try:
+        anonymizer = await run_in_threadpool(_create_anonymizer, plan)
+        payload = request.model_dump(exclude_unset=True)
+
+        anonymized_payload = await _anonymize_fields(anonymizer, payload, EMBEDDING_TEXT_FIELDS)
+        logger.debug(f"Anonymized payload: {anonymized_payload}")
+
+        # Embeddings contain no text, so there is nothing to deanonymize
+        return await _forward(settings.openai_embeddings_url, anonymized_payload)
+
+    except Exception as e:
+        logger.exception("Error processing request")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/v1/completions")
+async def proxy_completions(
+    request: CompletionRequest,
+    response: Response,
+    x_anonymizer_tenant: Optional[str] = Header(None),
+    x_anonymizer_entities: Optional[str] = Header(None),
+    x_anonymizer_priority: Optional[str] = Header(None)
+):
+    plan, tier = await run_in_threadpool(_resolve_plan, x_anonymizer_tenant, x_anonymizer_entities, x_anonymizer_priority)
+    response.headers[TIER_HEADER] = tier
+    try:
+        anonymizer = await run_in_threadpool(_create_anonymizer, plan)
+        payload = request.model_dump(exclude_unset=True)
+
+        anonymized_payload = await _anonymize_fields(anonymizer, payload, COMPLETION_TEXT_FIELDS)
+        logger.debug(f"Anonymized payload: {anonymized_payload}")
+
+        openai_response = await _forward(settings.openai_completions_url, anonymized_payload)
+
+        deanonymized_response = await run_in_threadpool(
+            profiler.call, "deanonymize_payload", anonymizer.deanonymize_payload, openai_response
+        )
         logger.debug(f"Deanonymized response: {deanonymized_response}")
-        
+
         return deanonymized_response
 
     except Exception as e:
         logger.exception("Error processing request")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def metrics():
+    scheduler = _scheduler
+    degradation = _degradation
+    return {
+        "scheduler": scheduler.metrics.snapshot() if scheduler is not None else None,
+        "degradation": degradation.snapshot() if degradation is not None else None
+    }
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Admin endpoints are disabled (404) unless ADMIN_TOKEN is configured"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(x_admin_token or "", settings.admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def _profiling_session() -> ProfilingSession:
+    profiler.stop_if_expired()
+    session = profiler.session or profiler.last_session
+    if session is None:
+        raise HTTPException(status_code=404, detail="No profiling session")
+    return session
+
+
+@app.post("/admin/profile", dependencies=[Depends(_require_admin)])
+async def start_profiling(mode: str = "sampling", requests: Optional[int] = None, seconds: Optional[float] = None):
+    """Profile the next `requests` requests, or the next `seconds` seconds (capped by profiling_max_seconds)"""
+    seconds = min(seconds or settings.profiling_max_seconds, settings.profiling_max_seconds)
+    analyzer = await run_in_threadpool(get_analyzer)
+    try:
+        session = profiler.start(
+            analyzer,
+            mode=mode,
+            requests=requests,
+            seconds=seconds,
+            sample_interval=settings.profiling_sample_interval_ms / 1000.0
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session.summary()
+
+
+@app.delete("/admin/profile", dependencies=[Depends(_require_admin)])
+async def stop_profiling():
+    profiler.stop()
+    return _profiling_session().summary()
+
+
+@app.get("/admin/profile", dependencies=[Depends(_require_admin)])
+async def profiling_summary():
+    """Status of the current (or last) session with the per-recognizer time breakdown"""
+    return _profiling_session().summary()
+
+
+@app.get("/admin/profile/folded", dependencies=[Depends(_require_admin)])
+async def profiling_folded_stacks():
+    """Sampled stacks in the collapsed format read by flamegraph.pl and speedscope"""
+    return PlainTextResponse(_profiling_session().folded())
+
+
+@app.get("/admin/profile/pstats", dependencies=[Depends(_require_admin)])
+async def profiling_pstats():
+    """cProfile data of a deterministic session, loadable with pstats.Stats(path) or snakeviz"""
+    dump = _profiling_session().pstats_dump()
+    if dump is None:
+        raise HTTPException(status_code=404, detail="No deterministic profile data")
+    return Response(
+        content=dump,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": "attachment; filename=anonymizer.pstats"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
-        "main:app",
+        "openai_anonymizer.main:app",
         host=settings.server_host,
         port=settings.server_port,
         reload=True
@@ -0,0 +1,316 @@
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+if TYPE_CHECKING:
+    from presidio_analyzer import AnalyzerEngine
+
+T = TypeVar("T")
+
+SAMPLING = "sampling"
+DETERMINISTIC = "deterministic"
+
+# a sampled stack ending in one of these modules is a thread waiting (for a lock, the
+# scheduler, a queue or a socket), not working: it is left out of the flamegraph
+IDLE_MODULES = ("threading.py", "queue.py", "selectors.py")
+
+
+class ProfilingSession:
+    """
+    Profile data collected for the next `requests` requests or `seconds` seconds.
+
+    In sampling mode the stacks of the threads running Profiler.call() (the request
+    and scheduler threads doing the analysis) are sampled every `sample_interval`
+    seconds, unless they are waiting (see IDLE_MODULES), and folded into
+    flamegraph-compatible lines ("frame;frame;frame count"). Idle pool threads and
+    the event loop are not sampled.
+    In deterministic mode the work passed to Profiler.call() runs under cProfile.
+    In both modes every recognizer of the analyzer, and the NLP engine, are timed.
+    """
+
+    def __init__(self, mode: str, requests: Optional[int], seconds: float, sample_interval: float):
+        if mode not in (SAMPLING, DETERMINISTIC):
+            raise ValueError(f"Unknown profiling mode {mode}, expected {SAMPLING} or {DETERMINISTIC}.")
+        if requests is not None and requests < 1:
+            raise ValueError("requests must be at least 1")
+        if seconds <= 0:
+            raise ValueError("seconds must be positive")
+
+        self.mode = mode
+        self.requests_left = requests
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + seconds
+        self.finished_at: Optional[float] = None
+        self.sample_interval = sample_interval
+        self.requests_profiled = 0
+
+        self._lock = threading.Lock()
+        self.folded_stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.stats: Optional[pstats.Stats] = None
+        # name -> [calls, seconds]
+        self.timings: Dict[str, List[float]] = {}
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def record_timing(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self.timings.setdefault(name, [0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+
+    def record_samples(self, stacks: List[str]) -> None:
+        with self._lock:
+            self.samples += 1
+            self.folded_stacks.update(stacks)
+
+    def record_profile(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    def folded(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.folded_stacks.most_common())
+
+    def pstats_dump(self) -> Optional[bytes]:
+        """Return the cProfile data in the format written by pstats.Stats.dump_stats()"""
+        with self._lock:
+            if self.stats is None:
+                return None
+            return marshal.dumps(self.stats.stats)  # type: ignore[attr-defined]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            breakdown = {
+                name: {"calls": int(calls), "seconds": seconds, "mean_ms": seconds / calls * 1000 if calls else 0.0}
+                for name, (calls, seconds) in sorted(self.timings.items(), key=lambda item: -item[1][1])
+            }
+            top_functions = ""
+            if self.stats is not None:
+                output = io.StringIO()
+                stats = pstats.Stats(stream=output)
+                stats.add(self.stats)
+                stats.sort_stats("cumulative").print_stats(30)
+                top_functions = output.getvalue()
+            return {
+                "mode": self.mode,
+                "state": "finished" if self.finished else "running",
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "requests_profiled": self.requests_profiled,
+                "samples": self.samples,
+                "breakdown": breakdown,
+                "top_functions": top_functions,
+            }
+
+
+class Profiler:
+    """
+    On-demand profiler for live traffic, idle unless a session was started.
+
+    While idle, the only cost on the request path is checking `self.session`.
+    Sessions are per process: with several workers each one is profiled separately.
+    """
+
+    def __init__(self):
+        self.session: Optional[ProfilingSession] = None
+        self.last_session: Optional[ProfilingSession] = None
+        self._lock = threading.Lock()
+        self._analyzer: Optional["AnalyzerEngine"] = None
+        self._sampler: Optional[threading.Thread] = None
+        # ident -> depth of the threads inside call(), the only ones sampled
+        self._calling_threads: Dict[int, int] = {}
+        self._calling_threads_lock = threading.Lock()
+
+    def start(
+        self,
+        analyzer: "AnalyzerEngine",
+        mode: str = SAMPLING,
+        requests: Optional[int] = None,
+        seconds: float = 30.0,
+        sample_interval: float = 0.005
+    ) -> ProfilingSession:
+        with self._lock:
+            if self.session is not None:
+                raise RuntimeError("A profiling session is already running.")
+            session = ProfilingSession(mode, requests, seconds, sample_interval)
+            self._analyzer = analyzer
+            self._instrument(analyzer, session)
+            self.session = session
+            if mode == SAMPLING:
+                self._sampler = threading.Thread(target=self._sample, args=(session,), name="profiler-sampler", daemon=True)
+                self._sampler.start()
+            return session
+
+    def stop(self) -> Optional[ProfilingSession]:
+        with self._lock:
+            session = self.session
+            if session is None:
+                return None
+            self.session = None
+            session.finished_at = time.time()
+            if self._analyzer is not None:
+                self._uninstrument(self._analyzer)
+                self._analyzer = None
+            self.last_session = session
+        if self._sampler is not None and self._sampler is not threading.current_thread():
+            self._sampler.join()
+        self._sampler = None
+        return session
+
+    def request_finished(self) -> None:
+        """Count a profiled request, stopping the session when its budget is exhausted"""
+        session = self.session
+        if session is None:
+            return
+        with session._lock:
+            session.requests_profiled += 1
+            if session.requests_left is not None:
+                session.requests_left -= 1
+            exhausted = (session.requests_left is not None and session.requests_left <= 0) or time.monotonic() >= session.deadline
+        if exhausted:
+            self.stop()
+
+    def stop_if_expired(self) -> None:
+        session = self.session
+        if session is not None and time.monotonic() >= session.deadline:
+            self.stop()
+
+    def call(self, name: str, function: Callable[..., T], *args: Any) -> T:
+        """
+        Run function(*args). While a session is running its duration is recorded
+        under name, and in deterministic mode it runs under cProfile.
+        """
+        session = self.session
+        if session is None:
+            return function(*args)
+        started_at = time.perf_counter()
+        try:
+            if session.mode != DETERMINISTIC:
+                return self._call_sampled(function, *args)
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python >= 3.12 allows a single active profiler, another thread is using it
+                return function(*args)
+            try:
+                return function(*args)
+            finally:
+                profile.disable()
+                session.record_profile(profile)
+        finally:
+            session.record_timing(name, time.perf_counter() - started_at)
+
+    def _call_sampled(self, function: Callable[..., T], *args: Any) -> T:
+        thread_id = threading.get_ident()
+        with self._calling_threads_lock:
+            self._calling_threads[thread_id] = self._calling_threads.get(thread_id, 0) + 1
+        try:
+            return function(*args)
+        finally:
+            with self._calling_threads_lock:
+                depth = self._calling_threads.pop(thread_id) - 1
+                if depth:
+                    self._calling_threads[thread_id] = depth
+
+    def _sample(self, session: ProfilingSession) -> None:
+        while self.session is session:
+            if time.monotonic() >= session.deadline:
+                self.stop()
+                return
+            with self._calling_threads_lock:
+                calling_threads = set(self._calling_threads)
+            stacks = [
+                self._fold(frame)
+                for thread_id, frame in sys._current_frames().items()
+                if thread_id in calling_threads and not frame.f_code.co_filename.endswith(IDLE_MODULES)
+            ]
+            session.record_samples(stacks)
+            time.sleep(session.sample_interval)
+
+    @staticmethod
+    def _fold(frame: Any) -> str:
+        frames: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    @staticmethod
+    def _instrument(analyzer: "AnalyzerEngine", session: ProfilingSession) -> None:
+        """Wrap each recognizer's analyze and the NLP engine with timers (as instance attributes)"""
+        for recognizer in analyzer.registry.recognizers:
+            # custom PatternRecognizers share their class name, the entities tell them apart
+            name = f"recognizer:{recognizer.name}[{','.join(recognizer.supported_entities)}]"
+            recognizer.analyze = _timed(recognizer.analyze, name, session)
+        nlp_engine = analyzer.nlp_engine
+        nlp_engine.process_text = _timed(nlp_engine.process_text, "nlp:process_text", session)  # type: ignore[method-assign]
+        nlp_engine.process_batch = _timed_iterator(nlp_engine.process_batch, "nlp:process_batch", session)  # type: ignore[method-assign]
+
+    @staticmethod
+    def _uninstrument(analyzer: "AnalyzerEngine") -> None:
+        for target in [*analyzer.registry.recognizers, analyzer.nlp_engine]:
+            for name in ("analyze", "process_text", "process_batch"):
+                target.__dict__.pop(name, None)
+
+
+def _timed(function: Callable[..., T], name: str, session: ProfilingSession) -> Callable[..., T]:
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        started_at = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            session.record_timing(name, time.perf_counter() - started_at)
+    return wrapper
+
+
+def _timed_iterator(function: Callable[..., Iterator[T]], name: str, session: ProfilingSession) -> Callable[..., Iterator[T]]:
+    """Like _timed, for generators: the time spent producing the items is recorded as one call"""
+    def wrapper(*args: Any, **kwargs: Any) -> Iterator[T]:
+        iterator = function(*args, **kwargs)
+        seconds = 0.0
+        try:
+            while True:
+                started_at = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - started_at
+                yield item
+        finally:
+            session.record_timing(name, seconds)
+    return wrapper
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware counting requests for the running session; a pass-through while idle"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if profiler.session is None or scope["type"] != "http" or scope["path"].startswith("/admin/"):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.request_finished()
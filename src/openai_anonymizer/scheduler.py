@@ -0,0 +1,202 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from presidio_analyzer import AnalyzerEngine, RecognizerResult
+
+from .profiling import profiler
+from .selection import AnalysisPlan
+
+
+@dataclass
+class _PendingText:
+    text: str
+    plan: AnalysisPlan
+    future: "Future[List[RecognizerResult]]"
+    submitted_at: float = field(default_factory=time.perf_counter)
+
+
+class SchedulerMetrics:
+    """
+    Thread safe counters describing how texts were grouped into batches.
+    """
+
+    # upper bounds of the batch size histogram buckets (the last bucket is unbounded)
+    BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.batch_size_counts = [0] * (len(self.BATCH_SIZE_BUCKETS) + 1)
+        self.queue_delay_seconds_sum = 0.0
+        self.queue_delay_seconds_max = 0.0
+        self.analysis_seconds_sum = 0.0
+
+    def record_batch(self, batch_size: int, queue_delays: List[float], analysis_seconds: float) -> None:
+        with self._lock:
+            self.batches += 1
+            self.texts += batch_size
+            self.batch_size_counts[self._bucket_index(batch_size)] += 1
+            self.queue_delay_seconds_sum += sum(queue_delays)
+            self.queue_delay_seconds_max = max(self.queue_delay_seconds_max, max(queue_delays))
+            self.analysis_seconds_sum += analysis_seconds
+
+    def _bucket_index(self, batch_size: int) -> int:
+        for index, upper_bound in enumerate(self.BATCH_SIZE_BUCKETS):
+            if batch_size <= upper_bound:
+                return index
+        return len(self.BATCH_SIZE_BUCKETS)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current values as a JSON serializable dict"""
+        with self._lock:
+            labels = [f"<={upper_bound}" for upper_bound in self.BATCH_SIZE_BUCKETS]
+            labels.append(f">{self.BATCH_SIZE_BUCKETS[-1]}")
+            return {
+                "batches": self.batches,
+                "texts": self.texts,
+                "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+                "batch_size_distribution": dict(zip(labels, self.batch_size_counts)),
+                "mean_queue_delay_seconds": self.queue_delay_seconds_sum / self.texts if self.texts else 0.0,
+                "max_queue_delay_seconds": self.queue_delay_seconds_max,
+                "analysis_seconds": self.analysis_seconds_sum,
+            }
+
+
+class AnalysisScheduler:
+    """
+    Micro-batching scheduler for the analyzer.
+
+    Texts submitted by concurrent requests are gathered for at most `max_wait_ms`
+    milliseconds, or until `max_batch_size` texts are queued, and then analyzed
+    with a single batched nlp.pipe() pass per analysis plan. Each caller gets
+    back the results for its own texts.
+
+    A larger window gives bigger batches (throughput) at the cost of latency;
+    `max_wait_ms=0` only batches texts that are already queued.
+    """
+
+    def __init__(
+        self,
+        analyzer: AnalyzerEngine,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 3.0,
+        nlp_batch_size: int = 32,
+        score_threshold: Optional[float] = None,
+        queue_delay_observer: Optional[Callable[[List[float]], None]] = None
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms cannot be negative")
+
+        self.default_plan = AnalysisPlan(analyzer)
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000.0
+        self.nlp_batch_size = nlp_batch_size
+        self.score_threshold = score_threshold
+        self.metrics = SchedulerMetrics()
+        # called with the queue delays of each batch (e.g. by the overload controller)
+        self.queue_delay_observer = queue_delay_observer
+
+        self._queue: "queue.Queue[Optional[_PendingText]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, text: str, plan: Optional[AnalysisPlan] = None) -> "Future[List[RecognizerResult]]":
+        """Queue text for analysis (with all recognizers unless a plan is given) and return a future for its results"""
+        self._ensure_started()
+        pending = _PendingText(text=text, plan=plan or self.default_plan, future=Future())
+        self._queue.put(pending)
+        return pending.future
+
+    def analyze(self, text: str, plan: Optional[AnalysisPlan] = None) -> List[RecognizerResult]:
+        """Analyze a single text, blocking until its batch has been processed"""
+        return self.submit(text, plan).result()
+
+    def analyze_many(self, texts: List[str], plan: Optional[AnalysisPlan] = None) -> List[List[RecognizerResult]]:
+        """Analyze several texts, which may end up in the same batch as other requests' texts"""
+        futures = [self.submit(text, plan) for text in texts]
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        """Stop the worker thread once the queued texts have been processed"""
+        with self._start_lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="analysis-scheduler", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stop = self._gather(first)
+            self._process(batch)
+            if stop:
+                return
+
+    def _gather(self, first: _PendingText) -> "tuple[List[_PendingText], bool]":
+        """Collect texts until the batch is full or the wait window has elapsed"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    pending = self._queue.get(timeout=remaining)
+                else:
+                    # window elapsed: still take whatever is already queued
+                    pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                return batch, True
+            batch.append(pending)
+        return batch, False
+
+    def _process(self, batch: List[_PendingText]) -> None:
+        # texts analyzed with different plans (entity allowlists) run as separate batches
+        batches_by_plan: Dict[int, List[_PendingText]] = {}
+        for pending in batch:
+            batches_by_plan.setdefault(id(pending.plan), []).append(pending)
+        for plan_batch in batches_by_plan.values():
+            self._process_plan_batch(plan_batch[0].plan, plan_batch)
+
+    def _process_plan_batch(self, plan: AnalysisPlan, batch: List[_PendingText]) -> None:
+        started_at = time.perf_counter()
+        queue_delays = [started_at - pending.submitted_at for pending in batch]
+        if self.queue_delay_observer is not None:
+            self.queue_delay_observer(queue_delays)
+        try:
+            results = profiler.call("scheduler:analysis_batch", lambda: plan.analyze_batch(
+                [pending.text for pending in batch],
+                batch_size=self.nlp_batch_size,
+                # always in this process: spaCy starts new processes on every pipe() call
+                # with n_process > 1, which costs far more than a micro-batch analysis
+                n_process=1,
+                score_threshold=plan.score_threshold if plan.score_threshold is not None else self.score_threshold
+            ))
+        except Exception as e:
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+        finally:
+            self.metrics.record_batch(len(batch), queue_delays, time.perf_counter() - started_at)
+
+        for pending, analyzer_results in zip(batch, results):
+            pending.future.set_result(analyzer_results)
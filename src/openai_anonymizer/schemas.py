@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 
 class Message(BaseModel):
     role: str
@@ -18,4 +18,30 @@ class OpenAIRequest(BaseModel):
     presence_penalty: Optional[float] = None
     frequency_penalty: Optional[float] = None
     logit_bias: Optional[Dict[int, float]] = None
-    user: Optional[str] = None
\ No newline at end of file
+    user: Optional[str] = None
+
+class EmbeddingRequest(BaseModel):
+    model: str
+    # a single string, a list of strings, or pre-tokenized input (token arrays are not anonymized)
+    input: Union[str, List[str], List[int], List[List[int]]]
+    encoding_format: Optional[str] = None
+    dimensions: Optional[int] = None
+    user: Optional[str] = None
+
+class CompletionRequest(BaseModel):
+    model: str
+    prompt: Union[str, List[str]]
+    suffix: Optional[str] = None
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    n: Optional[int] = None
+    stream: Optional[bool] = None
+    logprobs: Optional[int] = None
+    echo: Optional[bool] = None
+    stop: Optional[Union[str, List[str]]] = None
+    presence_penalty: Optional[float] = None
+    frequency_penalty: Optional[float] = None
+    best_of: Optional[int] = None
+    logit_bias: Optional[Dict[int, float]] = None
+    user: Optional[str] = None
@@ -0,0 +1,211 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, cast
+
+from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine, EntityRecognizer, RecognizerRegistry, RecognizerResult
+from presidio_analyzer.nlp_engine import NlpArtifacts, NlpEngine
+from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+
+
+def parse_entities(value: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Parse a comma separated entity list (e.g. a request header), None if empty"""
+    if not value:
+        return None
+    entities = frozenset(entity.strip().upper() for entity in value.split(",") if entity.strip())
+    return entities or None
+
+
+def analyzer_with_recognizers(
+    analyzer: AnalyzerEngine,
+    recognizers: List[EntityRecognizer],
+    nlp_engine: Optional[NlpEngine] = None
+) -> AnalyzerEngine:
+    """An engine running only the given recognizers, sharing the settings and (unless given another one) the NLP engine of analyzer"""
+    registry = RecognizerRegistry(
+        recognizers=recognizers,
+        global_regex_flags=analyzer.registry.global_regex_flags,
+        supported_languages=analyzer.supported_languages
+    )
+    return AnalyzerEngine(
+        registry=registry,
+        nlp_engine=nlp_engine or analyzer.nlp_engine,
+        supported_languages=analyzer.supported_languages,
+        default_score_threshold=analyzer.default_score_threshold,
+        context_aware_enhancer=analyzer.context_aware_enhancer
+    )
+
+
+class AnalysisPlan:
+    """
+    The recognizers to run for an entity allowlist, computed once.
+
+    A plan for a subset of the entities analyzes with an engine whose registry
+    only holds the recognizers able to produce them (sharing the recognizer
+    instances and the NLP engine of the full analyzer). When none of them is
+    NLP-backed the spaCy pipeline is skipped: the text is only tokenized, so
+    that context words can still raise the scores of pattern results.
+
+    `score_threshold`, when set, is the threshold the callers should analyze with
+    (e.g. the one of the tenant the analyzer was compiled for).
+    """
+
+    def __init__(
+        self,
+        analyzer: AnalyzerEngine,
+        entities: Optional[FrozenSet[str]] = None,
+        language: str = "en",
+        score_threshold: Optional[float] = None
+    ):
+        self.language = language
+        self.entities = entities
+        self.score_threshold = score_threshold
+        if entities is None:
+            self.analyzer = analyzer
+            self.recognizers = [r for r in analyzer.registry.recognizers if r.supported_language == language]
+        else:
+            self.recognizers = [
+                r for r in analyzer.registry.recognizers
+                if r.supported_language == language and entities.intersection(self._produced_entities(analyzer, r))
+            ]
+            if not self.recognizers:
+                raise ValueError(f"No recognizer supports any of the entities {sorted(entities)}.")
+            self.analyzer = analyzer_with_recognizers(analyzer, self.recognizers)
+        self.needs_nlp = any(self._is_nlp_backed(r) for r in self.recognizers)
+        self.batch_analyzer = BatchAnalyzerEngine(analyzer_engine=self.analyzer)
+        self._entities_list = sorted(entities) if entities is not None else None
+        # cheaper variants of this plan, see without_nlp() and with_nlp_engine()
+        self._variants: Dict[Any, Optional["AnalysisPlan"]] = {}
+        self._variants_lock = threading.Lock()
+
+    def without_nlp(self) -> Optional["AnalysisPlan"]:
+        """
+        The plan restricted to the recognizers that do not need the spaCy pipeline (itself
+        if none does), None if all of its recognizers need it.
+        """
+        if not self.needs_nlp:
+            return self
+        return self._variant("without_nlp", lambda: [r for r in self.recognizers if not self._is_nlp_backed(r)], None)
+
+    def with_nlp_engine(self, nlp_engine: NlpEngine) -> "AnalysisPlan":
+        """The plan running the same recognizers with another NLP engine (e.g. a smaller model)"""
+        if not self.needs_nlp or nlp_engine is self.analyzer.nlp_engine:
+            return self
+        # never None: a plan that needs NLP has recognizers
+        return cast("AnalysisPlan", self._variant(("nlp_engine", id(nlp_engine)), lambda: self.recognizers, nlp_engine))
+
+    def _variant(
+        self,
+        key: Any,
+        recognizers: Callable[[], List[EntityRecognizer]],
+        nlp_engine: Optional[NlpEngine]
+    ) -> Optional["AnalysisPlan"]:
+        # built once: the scheduler batches texts by plan, so a variant must stay the same object
+        with self._variants_lock:
+            if key not in self._variants:
+                selected = recognizers()
+                self._variants[key] = AnalysisPlan(
+                    analyzer_with_recognizers(self.analyzer, selected, nlp_engine),
+                    self.entities,
+                    self.language,
+                    self.score_threshold
+                ) if selected else None
+            return self._variants[key]
+
+    @staticmethod
+    def _is_nlp_backed(recognizer: EntityRecognizer) -> bool:
+        return isinstance(recognizer, SpacyRecognizer)
+
+    def _produced_entities(self, analyzer: AnalyzerEngine, recognizer: EntityRecognizer) -> List[str]:
+        """
+        Entities a recognizer can return. For the NLP recognizer these are the mapped
+        entities whose label the model actually predicts: e.g. PHONE_NUMBER is mapped in
+        the NER configuration but en_core_web_sm never produces it.
+        """
+        if not self._is_nlp_backed(recognizer):
+            return recognizer.supported_entities
+        nlp_engine = analyzer.nlp_engine
+        try:
+            nlp = nlp_engine.get_nlp(self.language)  # type: ignore[attr-defined]
+            mapping: Dict[str, str] = nlp_engine.ner_model_configuration.model_to_presidio_entity_mapping  # type: ignore[attr-defined]
+        except AttributeError:
+            return recognizer.supported_entities
+        labels = set()
+        for _name, pipe in nlp.pipeline:
+            labels.update(getattr(pipe, "labels", ()))
+        return [mapping[label] for label in labels if label in mapping]
+
+    def _tokenize(self, text: str) -> NlpArtifacts:
+        """NlpArtifacts holding only the tokens of text, without running the spaCy pipeline"""
+        nlp_engine = self.analyzer.nlp_engine
+        doc = nlp_engine.get_nlp(self.language).make_doc(text)  # type: ignore[attr-defined]
+        return NlpArtifacts(
+            entities=[],
+            tokens=doc,
+            tokens_indices=[token.idx for token in doc],
+            lemmas=[token.lower_ for token in doc],
+            nlp_engine=nlp_engine,
+            language=self.language
+        )
+
+    def analyze(self, text: str, score_threshold: Optional[float] = None) -> List[RecognizerResult]:
+        return self.analyzer.analyze(
+            text=text,
+            language=self.language,
+            entities=self._entities_list,
+            score_threshold=score_threshold,
+            nlp_artifacts=None if self.needs_nlp else self._tokenize(text)
+        )
+
+    def analyze_batch(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        n_process: int = 1,
+        score_threshold: Optional[float] = None
+    ) -> List[List[RecognizerResult]]:
+        if not self.needs_nlp:
+            return [self.analyze(text, score_threshold) for text in texts]
+        return self.batch_analyzer.analyze_iterator(
+            texts,
+            language=self.language,
+            batch_size=batch_size,
+            n_process=n_process,
+            entities=self._entities_list,
+            score_threshold=score_threshold
+        )
+
+
+class RecognizerSelector:
+    """
+    Keeps one AnalysisPlan per entity allowlist, so selecting recognizers is a dict lookup.
+
+    Allowlists can come from request headers, so only the `max_plans` most recently
+    used plans are kept.
+    """
+
+    def __init__(
+        self,
+        analyzer: AnalyzerEngine,
+        language: str = "en",
+        max_plans: int = 128,
+        score_threshold: Optional[float] = None
+    ):
+        self.analyzer = analyzer
+        self.language = language
+        self.score_threshold = score_threshold
+        self.max_plans = max_plans
+        self._plans: "OrderedDict[Optional[FrozenSet[str]], AnalysisPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def plan(self, entities: Optional[Iterable[str]] = None) -> AnalysisPlan:
+        key = frozenset(entities) if entities is not None else None
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+            plan = AnalysisPlan(self.analyzer, key, self.language, self.score_threshold)
+            self._plans[key] = plan
+            if len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+            return plan
@@ -0,0 +1,248 @@
+"""
+Preload-and-fork launcher.
+
+The analyzer engine (spaCy model + Presidio registry) is built once in the
+master process, the heap is frozen with gc.freeze() so that the garbage
+collector does not touch (and copy) the preloaded objects, and then N workers
+serving main.app are forked. The workers share the preloaded pages
+copy-on-write, and the master periodically logs each worker's unique (USS)
+and proportional (PSS) memory.
+
+A worker that exits is restarted, immediately the first time and then with a
+delay doubling with each restart in the last `restart_window` seconds (up to
+MAX_RESTART_DELAY). Beyond `max_restarts` restarts in that window the workers
+are considered to be crash looping (bad configuration, port, model...) and the
+master stops them and exits with status 1.
+
+Usage: python -m openai_anonymizer.server [--workers N] [--host HOST] [--port PORT]
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+import uvicorn
+
+from . import main
+from .config import settings
+from .watch import reload_all, reset_after_fork
+
+logger = logging.getLogger(__name__)
+
+RESTART_DELAY = 0.5
+MAX_RESTART_DELAY = 30.0
+
+
+def memory_usage(pid: int) -> Optional[Dict[str, int]]:
+    """Return the rss, pss and uss (private) memory of a process in kB, None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as file:
+            lines = file.readlines()
+    except OSError:
+        return None
+    values: Dict[str, int] = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+            values[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def format_memory_report(pids: List[int]) -> str:
+    lines = [f"{'pid':>8}{'rss (MiB)':>12}{'pss (MiB)':>12}{'uss (MiB)':>12}"]
+    for pid in pids:
+        usage = memory_usage(pid)
+        if usage is None:
+            lines.append(f"{pid:>8}{'n/a':>12}{'n/a':>12}{'n/a':>12}")
+        else:
+            lines.append(f"{pid:>8}{usage['rss'] / 1024:>12.1f}{usage['pss'] / 1024:>12.1f}{usage['uss'] / 1024:>12.1f}")
+    return "\n".join(lines)
+
+
+def preload() -> None:
+    """Build the shared analyzer in the master process and freeze the heap before forking"""
+    analyzer = main.get_analyzer()
+    # precompute the recognizer sets of the configured entity allowlists
+    main.get_selector()
+    # compile the configured tenant registries
+    main.get_tenant_registries()
+    # load the small model of the degraded tier, if any
+    main.get_degradation()
+    # run every recognizer once so that lazily compiled regexes are part of the shared heap too
+    analyzer.analyze(text="Preloading John Doe john@example.com 192.168.0.1", language="en")
+    # the analysis may have started reloads of the watched files (always with a snapshot, whose
+    # files are checked on first use): finish them here, a lock held by a reload thread at fork
+    # time would stay locked in every worker
+    reload_all()
+    gc.collect()
+    gc.freeze()
+
+
+def restart_delay(recent_restarts: int) -> float:
+    """Seconds to wait before restarting a worker, given the number of restarts in the current window"""
+    if recent_restarts == 0:
+        return 0.0
+    return min(MAX_RESTART_DELAY, RESTART_DELAY * 2 ** (recent_restarts - 1))
+
+
+class PreforkServer:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        workers: int,
+        memory_report_interval: float,
+        max_restarts: int = 10,
+        restart_window: float = 60.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.memory_report_interval = memory_report_interval
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.children: List[int] = []
+        self.should_exit = False
+        self.exit_code = 0
+        self._clock = clock
+        self._restart_times: Deque[float] = deque()
+        # times at which the workers waiting for a restart are due
+        self._pending_restarts: List[float] = []
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self, sock: socket.socket) -> int:
+        pid = os.fork()
+        if pid == 0:
+            # worker: restore default signal handling, uvicorn installs its own
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            # the files were last checked in the master, possibly long ago
+            reset_after_fork()
+            exit_code = 0
+            try:
+                config = uvicorn.Config(main.app, log_level=logging.getLevelName(logger.getEffectiveLevel()).lower())
+                uvicorn.Server(config).run(sockets=[sock])
+            except BaseException:
+                logger.exception("Worker %s crashed", os.getpid())
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        logger.info("Started worker %s", pid)
+        return pid
+
+    def _handle_exit(self, signum: int, frame: object) -> None:
+        self.should_exit = True
+
+    def run(self) -> int:
+        """Serve until SIGTERM/SIGINT (exit code 0) or until the workers crash loop (exit code 1)"""
+        preload()
+        sock = self._bind()
+        logger.info("Listening on %s:%s with %s workers", self.host, self.port, self.workers)
+
+        signal.signal(signal.SIGTERM, self._handle_exit)
+        signal.signal(signal.SIGINT, self._handle_exit)
+        self.children = [self._spawn(sock) for _ in range(self.workers)]
+
+        next_report = time.monotonic() + self.memory_report_interval
+        try:
+            while not self.should_exit:
+                self._reap(sock)
+                if self.memory_report_interval > 0 and time.monotonic() >= next_report:
+                    logger.info("Memory per process (master first):\n%s", format_memory_report([os.getpid()] + self.children))
+                    next_report = time.monotonic() + self.memory_report_interval
+                time.sleep(0.5)
+        finally:
+            self._stop()
+            sock.close()
+        return self.exit_code
+
+    def _reap(self, sock: socket.socket) -> None:
+        """Replace workers that exited unexpectedly, with backoff, and give up if they crash loop"""
+        for pid in list(self.children):
+            finished_pid, status = os.waitpid(pid, os.WNOHANG)
+            if finished_pid == 0:
+                continue
+            self.children.remove(pid)
+            if self.should_exit:
+                continue
+            now = self._clock()
+            while self._restart_times and now - self._restart_times[0] > self.restart_window:
+                self._restart_times.popleft()
+            if len(self._restart_times) >= self.max_restarts:
+                logger.error(
+                    "Worker %s exited with status %s, and workers were already restarted %s times in %s seconds: exiting",
+                    pid, status, len(self._restart_times), self.restart_window
+                )
+                self.exit_code = 1
+                self.should_exit = True
+                return
+            delay = restart_delay(len(self._restart_times))
+            logger.warning("Worker %s exited with status %s, restarting it in %.1f seconds", pid, status, delay)
+            self._restart_times.append(now)
+            self._pending_restarts.append(now + delay)
+
+        if self._pending_restarts and not self.should_exit:
+            now = self._clock()
+            due = [restart_at for restart_at in self._pending_restarts if restart_at <= now]
+            self._pending_restarts = [restart_at for restart_at in self._pending_restarts if restart_at > now]
+            for _ in due:
+                self.children.append(self._spawn(sock))
+
+    def _stop(self) -> None:
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.children = []
+
+
+def run(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Preload the analyzer once and fork workers serving the proxy")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=settings.server_workers)
+    parser.add_argument("--memory-report-interval", type=float, default=settings.memory_report_interval,
+                        help="seconds between per-worker memory reports, 0 to disable")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "fork"):
+        sys.exit("The preload-and-fork launcher requires os.fork(); use `python -m openai_anonymizer.main` instead.")
+
+    logging.basicConfig(level=logging.INFO)
+    server = PreforkServer(
+        args.host,
+        args.port,
+        args.workers,
+        args.memory_report_interval,
+        max_restarts=settings.server_max_restarts,
+        restart_window=settings.server_restart_window
+    )
+    sys.exit(server.run())
+
+
+if __name__ == "__main__":
+    run()
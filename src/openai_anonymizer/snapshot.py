@@ -0,0 +1,272 @@
+"""
+On-disk snapshot of the fully configured analyzer, for fast cold starts.
+
+A snapshot directory holds each spaCy pipeline saved with nlp.to_disk() and a
+pickled registry in which every pattern is already compiled, so that booting
+only loads files instead of resolving the model packages, instantiating the
+predefined recognizers from their YAML configuration and compiling each regex
+on first use.
+
+Usage:
+    python -m openai_anonymizer.snapshot build PATH
+    python -m openai_anonymizer.snapshot report [--snapshot PATH]
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from presidio_analyzer import AnalyzerEngine
+
+SNAPSHOT_FORMAT = 2
+MANIFEST_FILE = "manifest.json"
+REGISTRY_FILE = "registry.pkl"
+REGISTRY_DIGEST_KEY = "registry_sha256"
+MODELS_DIR = "models"
+
+
+# modules defining the recognizers of the registry (and their pickled state), relative to the package directory
+RECOGNIZER_SOURCES = ["anonymizer.py", "custom_recognizers", "watch.py"]
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _sources_digest() -> str:
+    """Hash of the source of the modules defining the recognizers (e.g. _add_custom_recognizers)"""
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    paths: List[str] = []
+    for source in RECOGNIZER_SOURCES:
+        source_path = os.path.join(package_dir, source)
+        if os.path.isdir(source_path):
+            paths.extend(
+                os.path.join(directory, name)
+                for directory, _, names in os.walk(source_path)
+                for name in names if name.endswith(".py")
+            )
+        else:
+            paths.append(source_path)
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.relpath(path, package_dir).encode("utf-8"))
+        digest.update(_file_digest(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def _fingerprint() -> Dict[str, Any]:
+    """The inputs that shape the registry besides the library versions: settings and recognizer code"""
+    from importlib.metadata import PackageNotFoundError, version
+    from .config import settings
+
+    dictionary_files: Dict[str, Optional[str]] = {}
+    for entity, path in sorted(settings.dictionary_files.items()):
+        try:
+            dictionary_files[entity] = f"{os.path.abspath(path)}:{_file_digest(path)}"
+        except OSError:
+            dictionary_files[entity] = None
+    try:
+        package_version: Optional[str] = version("openai-anonymizer")
+    except PackageNotFoundError:
+        package_version = None
+    return {
+        "package": package_version,
+        "recognizer_sources": _sources_digest(),
+        "dictionary_files": dictionary_files,
+        "dictionary_case_sensitive": settings.dictionary_case_sensitive,
+        "dictionary_normalize_whitespace": settings.dictionary_normalize_whitespace,
+        # kept by the pickled dictionary recognizers too
+        "dictionary_reload_interval": settings.dictionary_reload_interval,
+        "dictionary_cache_dir": settings.dictionary_cache_dir,
+    }
+
+
+def _versions() -> Dict[str, Any]:
+    """The manifest of a snapshot built now: a snapshot with another one is stale"""
+    from importlib.metadata import version
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "python": list(sys.version_info[:2]),
+        "presidio-analyzer": version("presidio-analyzer"),
+        "spacy": version("spacy"),
+        "fingerprint": _fingerprint(),
+    }
+
+
+def precompile_patterns(analyzer: "AnalyzerEngine") -> None:
+    """Compile the regex of every pattern recognizer with the flags used at analysis time"""
+    import regex
+    from presidio_analyzer import PatternRecognizer
+
+    flags = analyzer.registry.global_regex_flags
+    for recognizer in analyzer.registry.recognizers:
+        if isinstance(recognizer, PatternRecognizer):
+            flags_used = recognizer.global_regex_flags or flags
+            for pattern in recognizer.patterns:
+                if pattern.compiled_regex is None or pattern.compiled_with_flags != flags_used:
+                    pattern.compiled_regex = regex.compile(pattern.regex, flags=flags_used)
+                    pattern.compiled_with_flags = flags_used
+
+
+def save_snapshot(analyzer: "AnalyzerEngine", path: str) -> None:
+    """Write the analyzer (spaCy pipelines + registry) to the directory path, replacing it"""
+    nlp_engine = analyzer.nlp_engine
+    nlp = getattr(nlp_engine, "nlp", None)
+    if not isinstance(nlp, dict):
+        raise ValueError("Only spaCy based NLP engines can be saved in a snapshot.")
+
+    precompile_patterns(analyzer)
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    temporary_path = tempfile.mkdtemp(prefix=".snapshot-", dir=parent)
+    try:
+        os.makedirs(os.path.join(temporary_path, MODELS_DIR))
+        for lang_code, pipeline in nlp.items():
+            pipeline.to_disk(os.path.join(temporary_path, MODELS_DIR, lang_code))
+        state = {
+            "recognizers": analyzer.registry.recognizers,
+            "global_regex_flags": analyzer.registry.global_regex_flags,
+            "supported_languages": analyzer.supported_languages,
+            "default_score_threshold": analyzer.default_score_threshold,
+            "context_aware_enhancer": analyzer.context_aware_enhancer,
+            "ner_model_configuration": nlp_engine.ner_model_configuration,  # type: ignore[attr-defined]
+            "languages": list(nlp),
+        }
+        with open(os.path.join(temporary_path, REGISTRY_FILE), "wb") as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        manifest = _versions()
+        manifest[REGISTRY_DIGEST_KEY] = _file_digest(os.path.join(temporary_path, REGISTRY_FILE))
+        with open(os.path.join(temporary_path, MANIFEST_FILE), "w") as file:
+            json.dump(manifest, file, indent=2)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(temporary_path, path)
+    except BaseException:
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        raise
+
+
+def load_snapshot(path: str) -> "AnalyzerEngine":
+    """
+    Load an analyzer saved with save_snapshot, raising ValueError if it is stale: built by other
+    library versions, other recognizer code, or other dictionary settings or files
+    """
+    from presidio_analyzer import AnalyzerEngine, RecognizerRegistry
+    from presidio_analyzer.nlp_engine import SpacyNlpEngine
+
+    with open(os.path.join(path, MANIFEST_FILE)) as file:
+        manifest = json.load(file)
+    if not isinstance(manifest, dict):
+        raise ValueError(f"Snapshot {path} has an invalid manifest.")
+    registry_digest = manifest.pop(REGISTRY_DIGEST_KEY, None)
+    expected = _versions()
+    if manifest != expected:
+        raise ValueError(f"Snapshot {path} is stale: it was built with {manifest}, expected {expected}.")
+
+    # a truncated or modified registry would otherwise fail (or worse) while unpickling
+    registry_path = os.path.join(path, REGISTRY_FILE)
+    if registry_digest != _file_digest(registry_path):
+        raise ValueError(f"Snapshot {path} is corrupted: {REGISTRY_FILE} does not match its manifest.")
+    with open(registry_path, "rb") as file:
+        state = pickle.load(file)
+
+    nlp_engine = SpacyNlpEngine(
+        models=[
+            {"lang_code": lang_code, "model_name": os.path.join(path, MODELS_DIR, lang_code)}
+            for lang_code in state["languages"]
+        ],
+        ner_model_configuration=state["ner_model_configuration"]
+    )
+    registry = RecognizerRegistry(
+        recognizers=state["recognizers"],
+        global_regex_flags=state["global_regex_flags"],
+        supported_languages=state["supported_languages"]
+    )
+    return AnalyzerEngine(
+        registry=registry,
+        nlp_engine=nlp_engine,
+        supported_languages=state["supported_languages"],
+        default_score_threshold=state["default_score_threshold"],
+        context_aware_enhancer=state["context_aware_enhancer"]
+    )
+
+
+_REPORT_SCRIPT = """
+import json, sys, time
+timings = {}
+started_at = time.perf_counter()
+import openai_anonymizer.main as main
+timings["import openai_anonymizer.main"] = time.perf_counter() - started_at
+started_at = time.perf_counter()
+import presidio_analyzer, presidio_anonymizer, spacy
+timings["import presidio + spacy"] = time.perf_counter() - started_at
+started_at = time.perf_counter()
+analyzer = main.get_analyzer()
+timings[sys.argv[1]] = time.perf_counter() - started_at
+started_at = time.perf_counter()
+analyzer.analyze(text="John Doe, john@example.com, 192.168.0.1", language="en")
+timings["first analyze"] = time.perf_counter() - started_at
+print(json.dumps(timings))
+"""
+
+
+def _measure(label: str, snapshot: Optional[str]) -> Dict[str, float]:
+    """Measure the startup phases in a fresh interpreter, so nothing is already imported"""
+    environment = dict(os.environ)
+    environment.pop("ANALYZER_SNAPSHOT", None)
+    if snapshot is not None:
+        environment["ANALYZER_SNAPSHOT"] = snapshot
+    output = subprocess.run(
+        [sys.executable, "-c", _REPORT_SCRIPT, label],
+        env=environment,
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(snapshot: Optional[str]) -> str:
+    rows: List[Dict[str, float]] = [_measure("build analyzer", None)]
+    if snapshot is not None:
+        rows.append(_measure("load snapshot", snapshot))
+    lines = []
+    for timings in rows:
+        for phase, seconds in timings.items():
+            lines.append(f"{phase:<32}{seconds:>10.3f} s")
+        lines.append(f"{'total':<32}{sum(timings.values()):>10.3f} s")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def run(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the analyzer snapshot or report import and startup times")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_command = commands.add_parser("build", help="build the analyzer from the settings and save it to PATH")
+    build_command.add_argument("path")
+    report_command = commands.add_parser("report", help="time imports and analyzer startup in a fresh interpreter")
+    report_command.add_argument("--snapshot", help="also time loading this snapshot")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        from . import main
+        save_snapshot(main.build_analyzer(), args.path)
+        print(f"Snapshot saved to {args.path}")
+    else:
+        print(report(args.snapshot))
+
+
+if __name__ == "__main__":
+    run()
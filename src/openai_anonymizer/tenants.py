@@ -0,0 +1,196 @@
+r"""
+Per-tenant recognizer configurations.
+
+A tenant configuration file (YAML, or JSON) declares pattern recognizers in the
+format of presidio's recognizer configuration, and the score threshold:
+
+    score_threshold: 0.7
+    recognizers:
+      - supported_entity: EMPLOYEE_ID
+        patterns:
+          - {name: employee_id, regex: '\bEMP-\d{6}\b', score: 0.8}
+        context: [employee, badge]
+      - supported_entity: USERNAME
+        patterns:
+          - {name: acme_login, regex: '\bacme-[a-z]+\d{2}\b', score: 0.9}
+        context: [login]
+
+A tenant recognizer replaces the built-in custom recognizer of the same entity
+(see CUSTOM_RECOGNIZER_NAMES) and the other recognizers of the shared analyzer
+are kept. Each configuration is compiled once into a registry sharing the NLP
+engine and the recognizer instances of the shared analyzer.
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import regex
+import yaml
+from presidio_analyzer import AnalyzerEngine, PatternRecognizer
+
+from .anonymizer import CUSTOM_RECOGNIZER_NAMES
+from .selection import RecognizerSelector, analyzer_with_recognizers
+from .snapshot import precompile_patterns
+from .watch import WatchedFile
+
+logger = logging.getLogger(__name__)
+
+CONFIG_KEYS = {"score_threshold", "recognizers"}
+
+
+class TenantConfigurationError(Exception):
+    """The configuration file of a tenant could not be loaded (at startup, or since)"""
+
+
+@dataclass(frozen=True)
+class TenantRegistry:
+    """A tenant configuration compiled against the shared analyzer, never modified once built"""
+    config_hash: str
+    score_threshold: Optional[float]
+    analyzer: AnalyzerEngine
+    selector: RecognizerSelector
+
+
+@dataclass(frozen=True)
+class _LoadedConfig:
+    config_hash: str
+    config: Dict[str, Any]
+
+
+def read_tenant_config(path: str) -> Dict[str, Any]:
+    """Read and validate the top level of a tenant configuration file"""
+    with open(path) as file:
+        # JSON documents are valid YAML
+        config = yaml.safe_load(file)
+    if config is None:
+        config = {}
+    if not isinstance(config, dict):
+        raise ValueError(f"Tenant configuration {path} must be a mapping.")
+    unknown_keys = set(config) - CONFIG_KEYS
+    if unknown_keys:
+        raise ValueError(f"Unknown keys {sorted(unknown_keys)} in tenant configuration {path}.")
+    return config
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    """Hash of the configuration content, independent of the formatting and key order of the file"""
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def compile_tenant_config(analyzer: AnalyzerEngine, config: Dict[str, Any]) -> TenantRegistry:
+    """Build the registry of a tenant configuration, raising ValueError if it is invalid"""
+    score_threshold = config.get("score_threshold")
+    if score_threshold is not None and (
+        not isinstance(score_threshold, (int, float)) or isinstance(score_threshold, bool) or not 0 <= score_threshold <= 1
+    ):
+        raise ValueError(f"score_threshold must be a number between 0 and 1, got {score_threshold!r}.")
+
+    recognizer_configs = config.get("recognizers") or []
+    if not isinstance(recognizer_configs, list):
+        raise ValueError("recognizers must be a list.")
+    try:
+        tenant_recognizers = [PatternRecognizer.from_dict(recognizer_config) for recognizer_config in recognizer_configs]
+    except (TypeError, KeyError, ValueError, AttributeError) as e:
+        raise ValueError(f"Invalid recognizer configuration: {e}") from e
+
+    replaced_entities = {entity for recognizer in tenant_recognizers for entity in recognizer.supported_entities}
+    shared_recognizers = [
+        recognizer for recognizer in analyzer.registry.recognizers
+        if not (recognizer.name in CUSTOM_RECOGNIZER_NAMES and replaced_entities.intersection(recognizer.supported_entities))
+    ]
+    tenant_analyzer = analyzer_with_recognizers(analyzer, shared_recognizers + tenant_recognizers)
+    try:
+        precompile_patterns(tenant_analyzer)
+    except regex.error as e:
+        raise ValueError(f"Invalid pattern: {e}") from e
+
+    selector = RecognizerSelector(tenant_analyzer, score_threshold=score_threshold)
+    # the plan with all the recognizers, used by requests without an entity allowlist
+    selector.plan()
+    return TenantRegistry(
+        config_hash=config_hash(config),
+        score_threshold=score_threshold,
+        analyzer=tenant_analyzer,
+        selector=selector
+    )
+
+
+class TenantRegistryCache:
+    """
+    Compiled tenant registries, looked up by tenant name.
+
+    Registries are kept in an LRU keyed by configuration hash, so tenants with the
+    same configuration share one, and only the `max_registries` most recently used
+    ones stay in memory (an evicted one is compiled again when its tenant returns).
+
+    Each file is checked for changes at most every `reload_interval` seconds, and a
+    new version is compiled in the background while requests keep using the previous
+    one (see WatchedFile); an invalid file is logged and the previous version kept.
+    A tenant whose file has never loaded (e.g. invalid at startup) is logged once, and
+    get() raises TenantConfigurationError for it until the file is fixed, without
+    affecting the other tenants.
+    """
+
+    def __init__(
+        self,
+        analyzer: AnalyzerEngine,
+        files: Dict[str, str],
+        max_registries: int = 32,
+        reload_interval: float = 5.0
+    ):
+        if max_registries < 1:
+            raise ValueError("max_registries must be at least 1")
+        self.analyzer = analyzer
+        self.max_registries = max_registries
+        self._registries: "OrderedDict[str, TenantRegistry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tenants = {tenant: WatchedFile(path, self._load, reload_interval) for tenant, path in files.items()}
+        for tenant, tenant_file in self._tenants.items():
+            if tenant_file.value is None:
+                logger.error(f"Invalid configuration for tenant {tenant} ({tenant_file.path}): {tenant_file.error}")
+
+    def get(self, tenant: Optional[str]) -> Optional[TenantRegistry]:
+        """
+        The registry of tenant, None for tenants without a configuration file, raising
+        TenantConfigurationError if its file has not loaded successfully yet
+        """
+        tenant_file = self._tenants.get(tenant) if tenant else None
+        if tenant_file is None:
+            return None
+        loaded = tenant_file.get()
+        if loaded is None:
+            raise TenantConfigurationError(f"Invalid configuration for tenant {tenant}: {tenant_file.error}")
+        return self._registry(loaded)
+
+    def invalid_tenants(self) -> List[str]:
+        """The tenants whose configuration file has not loaded successfully yet"""
+        return [tenant for tenant, tenant_file in self._tenants.items() if tenant_file.value is None]
+
+    def _load(self, path: str) -> _LoadedConfig:
+        try:
+            config = read_tenant_config(path)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML: {e}") from e
+        loaded = _LoadedConfig(config_hash(config), config)
+        # compile before switching, so that requests never wait for it
+        self._registry(loaded)
+        return loaded
+
+    def _registry(self, loaded: _LoadedConfig) -> TenantRegistry:
+        with self._lock:
+            registry = self._registries.get(loaded.config_hash)
+            if registry is not None:
+                self._registries.move_to_end(loaded.config_hash)
+                return registry
+        # compiled outside the lock so that the other tenants are not blocked
+        registry = compile_tenant_config(self.analyzer, loaded.config)
+        with self._lock:
+            registry = self._registries.setdefault(loaded.config_hash, registry)
+            self._registries.move_to_end(loaded.config_hash)
+            while len(self._registries) > self.max_registries:
+                self._registries.popitem(last=False)
+            return registry
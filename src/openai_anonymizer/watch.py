@@ -0,0 +1,155 @@
+"""
+Values loaded from files that are reloaded when the files change.
+
+A WatchedFile is checked for changes (mtime and size) at most every
+`reload_interval` seconds, when its value is read. A changed file is loaded on
+a background thread and swapped in once loaded, so readers never wait for it
+and keep getting the previous value meanwhile. A version that fails to load is
+logged and the previous value kept until the file changes again.
+
+Before forking workers, the launcher calls reload_all() so that no reload
+thread runs (and holds a lock) at fork time, and each worker calls
+reset_after_fork() so that its files are checked again on first use.
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Callable, Generic, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# every WatchedFile of the process, for reload_all() and reset_after_fork()
+_watched_files: "weakref.WeakSet[WatchedFile]" = weakref.WeakSet()
+
+
+def reload_all() -> None:
+    """Wait for the running background checks, then check every watched file on this thread"""
+    for watched in list(_watched_files):
+        with watched._reload_lock:
+            watched._last_check = time.monotonic()
+            watched._reload_logging_errors()
+
+
+def reset_after_fork() -> None:
+    """In a forked child: new locks, and every file checked again on first use"""
+    for watched in list(_watched_files):
+        watched._reload_lock = threading.Lock()
+        watched._last_check = float("-inf")
+
+
+class WatchedFile(Generic[T]):
+    """
+    The value load(path) of a file, reloaded when the file changes, see the module docstring.
+
+    The first version is loaded in __init__; if it fails, value is None and error holds
+    the exception, until a later version of the file loads.
+    """
+
+    def __init__(self, path: str, load: Callable[[str], T], reload_interval: float = 5.0):
+        self.path = path
+        self.load = load
+        self.reload_interval = reload_interval
+        self.value: Optional[T] = None
+        self.error: Optional[Exception] = None
+
+        self._reload_lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._file_version: Optional[Tuple[int, int]] = None
+        try:
+            self._reload_if_changed_locked()
+        except Exception as e:
+            self.error = e
+        _watched_files.add(self)
+
+    def __getstate__(self) -> dict:
+        # pickled in analyzer snapshots: the lock and the monotonic clock are per process
+        state = self.__dict__.copy()
+        del state["_reload_lock"]
+        del state["_last_check"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._reload_lock = threading.Lock()
+        # the file may have changed since the value was pickled, check it on first use
+        self._last_check = float("-inf")
+        _watched_files.add(self)
+
+    def get(self) -> Optional[T]:
+        """The current value, starting a background reload if the file is due for a check"""
+        if time.monotonic() - self._last_check >= self.reload_interval:
+            self.reload_in_background()
+        return self.value
+
+    def reload_if_changed(self) -> bool:
+        """Reload the file now if it changed, return True if a new value was loaded"""
+        # a single thread checks the file, the others keep using the current value
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_check = time.monotonic()
+            return self._reload_logging_errors()
+        finally:
+            self._reload_lock.release()
+
+    def reload_in_background(self) -> Optional[threading.Thread]:
+        """Run reload_if_changed() on a background thread and return it, None if a check is already running"""
+        if not self._reload_lock.acquire(blocking=False):
+            return None
+        self._last_check = time.monotonic()
+        try:
+            thread = threading.Thread(
+                target=self._reload_and_release,
+                name=f"reload-{os.path.basename(self.path)}",
+                daemon=True
+            )
+            thread.start()
+        except BaseException:
+            self._reload_lock.release()
+            raise
+        return thread
+
+    def wait_for_reload(self) -> None:
+        """Wait until the check running in the background, if any, is done"""
+        with self._reload_lock:
+            pass
+
+    def _reload_and_release(self) -> None:
+        try:
+            self._reload_logging_errors()
+        finally:
+            self._reload_lock.release()
+
+    def _reload_logging_errors(self) -> bool:
+        try:
+            return self._reload_if_changed_locked()
+        except Exception as e:
+            self.error = e
+            if self.value is None:
+                logger.error(f"Cannot load {self.path}: {e}")
+            else:
+                logger.warning(f"Cannot load {self.path}, keeping the previous version: {e}")
+            return False
+
+    def _reload_if_changed_locked(self) -> bool:
+        try:
+            # stat before reading, so that a write during the read is picked up by the next check
+            stat = os.stat(self.path)
+        except OSError:
+            if self.value is None:
+                raise
+            # keep serving the last version while the file is being replaced
+            return False
+        file_version = (stat.st_mtime_ns, stat.st_size)
+        if file_version == self._file_version:
+            return False
+        # a version that fails to load is not retried until the file changes again
+        self._file_version = file_version
+        # the value is replaced only once the new one is loaded
+        self.value = self.load(self.path)
+        self.error = None
+        return True
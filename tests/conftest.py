@@ -0,0 +1,8 @@
+import pytest
+from presidio_analyzer import AnalyzerEngine
+from openai_anonymizer.anonymizer import OpenAIPayloadAnonymizer
+
+@pytest.fixture(scope="session")
+def analyzer() -> AnalyzerEngine:
+    """Analyzer shared by all the tests: loading the NLP model and registering the recognizers is slow"""
+    return OpenAIPayloadAnonymizer.create_analyzer()
@@ -1,13 +1,14 @@
 import copy
 from typing import Any, Dict
 import pytest
+from presidio_analyzer import AnalyzerEngine
 from openai_anonymizer.anonymizer import OpenAIPayloadAnonymizer
 
 class TestOpenAIPayloadAnonymizer:
     @pytest.fixture
-    def anonymizer(self):
-        """Fixture providing a fresh anonymizer for each test"""
-        return OpenAIPayloadAnonymizer()
+    def anonymizer(self, analyzer: AnalyzerEngine):
+        """Fixture providing a fresh anonymizer for each test (sharing the session analyzer)"""
+        return OpenAIPayloadAnonymizer(analyzer=analyzer)
 
     def test_initialization(self, anonymizer: OpenAIPayloadAnonymizer):
         """Test that the anonymizer initializes correctly"""
@@ -348,3 +349,19 @@ class TestOpenAIPayloadAnonymizer:
         assert "<IP_ADDRESS_" in anonymized["ip"]
         assert "<IP_ADDRESS_" in anonymized["message"]
         assert "<USERNAME_" in anonymized["user"]
+
+    def test_anonymize_texts_batch(self, anonymizer: OpenAIPayloadAnonymizer):
+        """Test that a batch of texts is anonymized consistently and in order"""
+        texts = [
+            "Contact alice@example.com",
+            "",
+            "Server 10.0.0.1 and again alice@example.com",
+        ]
+        anonymized = anonymizer.anonymize_texts(texts)
+
+        assert [result.text for result in anonymized] == [
+            "Contact <EMAIL_ADDRESS_0>",
+            "",
+            "Server <IP_ADDRESS_0> and again <EMAIL_ADDRESS_0>",
+        ]
+        assert anonymizer.anonymize_texts([]) == []
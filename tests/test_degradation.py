@@ -0,0 +1,98 @@
+import pytest
+from presidio_analyzer import AnalyzerEngine
+from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+from openai_anonymizer.degradation import FULL, PATTERNS, SMALL_MODEL, DegradationController, create_small_nlp_engine
+from openai_anonymizer.selection import AnalysisPlan, analyzer_with_recognizers
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.cpu = 0.0
+
+    def advance(self, seconds: float, cpu: float = 0.0):
+        self.now += seconds
+        self.cpu += seconds * cpu
+
+def _controller(clock: FakeClock, tiers=(FULL, PATTERNS), small_nlp_engine=None) -> DegradationController:
+    return DegradationController(
+        list(tiers),
+        queue_delay_slo_ms=50,
+        cpu_slo=0.9,
+        recovery_ratio=0.5,
+        step_up_seconds=3,
+        interval_seconds=1,
+        small_nlp_engine=small_nlp_engine,
+        clock=lambda: clock.now,
+        cpu_clock=lambda: clock.cpu
+    )
+
+class TestDegradationController:
+    def test_steps_down_on_queue_delay_and_back_up_with_hysteresis(self, analyzer: AnalyzerEngine):
+        clock = FakeClock()
+        controller = _controller(clock)
+        plan = AnalysisPlan(analyzer)
+
+        controller.record_queue_delays([0.2, 0.1])
+        clock.advance(1)
+        degraded_plan, tier = controller.apply(plan)
+        assert tier == PATTERNS
+        assert degraded_plan.needs_nlp is False
+        assert not any(isinstance(r, SpacyRecognizer) for r in degraded_plan.recognizers)
+        # high priority traffic is never degraded
+        assert controller.apply(plan, "high") == (plan, FULL)
+
+        # below the SLO but above the recovery threshold: hold
+        for _ in range(5):
+            controller.record_queue_delays([0.04])
+            clock.advance(1)
+            assert controller.apply(plan)[1] == PATTERNS
+
+        for _ in range(2):
+            clock.advance(1)
+            assert controller.apply(plan)[1] == PATTERNS
+        clock.advance(1)
+        assert controller.apply(plan) == (plan, FULL)
+
+        snapshot = controller.snapshot()
+        assert snapshot["step_downs"] == 1 and snapshot["step_ups"] == 1
+        assert snapshot["requests_per_tier"] == {FULL: 2, SMALL_MODEL: 0, PATTERNS: 8}
+
+    def test_steps_down_on_cpu_one_tier_per_interval(self, analyzer: AnalyzerEngine):
+        clock = FakeClock()
+        controller = _controller(clock, tiers=(FULL, SMALL_MODEL, PATTERNS), small_nlp_engine=analyzer.nlp_engine)
+
+        clock.advance(1, cpu=1.0)
+        controller.apply(AnalysisPlan(analyzer))
+        assert controller.tier == SMALL_MODEL
+        clock.advance(0.5, cpu=1.0)
+        controller.apply(AnalysisPlan(analyzer))
+        assert controller.tier == SMALL_MODEL
+        clock.advance(0.5, cpu=1.0)
+        controller.apply(AnalysisPlan(analyzer))
+        assert controller.tier == PATTERNS
+
+    def test_invalid_tiers(self):
+        with pytest.raises(ValueError):
+            DegradationController(["full", "tiny"])
+        with pytest.raises(ValueError):
+            DegradationController(["full", "small_model"])
+
+class TestPlanVariants:
+    def test_plan_without_nlp_recognizers(self, analyzer: AnalyzerEngine):
+        plan = AnalysisPlan(analyzer)
+
+        assert plan.without_nlp() is plan.without_nlp()
+        assert plan.without_nlp().without_nlp() is plan.without_nlp()
+        spacy_recognizers = [r for r in analyzer.registry.recognizers if isinstance(r, SpacyRecognizer)]
+        assert AnalysisPlan(analyzer_with_recognizers(analyzer, spacy_recognizers)).without_nlp() is None
+
+    def test_plan_with_small_model(self, analyzer: AnalyzerEngine):
+        plan = AnalysisPlan(analyzer)
+        small_nlp_engine = create_small_nlp_engine(analyzer, "en_core_web_sm")
+
+        assert plan.with_nlp_engine(analyzer.nlp_engine) is plan
+        variant = plan.with_nlp_engine(small_nlp_engine)
+        assert variant is plan.with_nlp_engine(small_nlp_engine)
+        assert variant.analyzer.nlp_engine is small_nlp_engine
+        assert variant.recognizers == plan.recognizers
+        assert "EMAIL_ADDRESS" in [r.entity_type for r in variant.analyze("Mail alice@example.com")]
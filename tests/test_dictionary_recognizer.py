@@ -0,0 +1,128 @@
+import os
+import threading
+from pathlib import Path
+from typing import List
+import pytest
+from presidio_analyzer import RecognizerResult
+from openai_anonymizer.custom_recognizers.dictionaryRecognizer import AhoCorasickAutomaton, DictionaryRecognizer, load_automaton
+
+def _matched(text: str, results: List[RecognizerResult]) -> List[str]:
+    return sorted(text[r.start:r.end] for r in results)
+
+class TestAhoCorasickAutomaton:
+    def test_overlapping_terms(self):
+        """Test that all occurrences are found, including terms contained in other terms"""
+        automaton = AhoCorasickAutomaton(["he", "she", "his", "hers"])
+        text = "ushers"
+        assert sorted(text[s:e] for s, e in automaton.iter_matches(text)) == ["he", "hers", "she"]
+
+    def test_empty_terms_are_ignored(self):
+        automaton = AhoCorasickAutomaton(["", "abc", "abc"])
+        assert automaton.size == 1
+        assert list(automaton.iter_matches("")) == []
+
+class TestDictionaryRecognizer:
+    def test_case_insensitive_match(self):
+        recognizer = DictionaryRecognizer("CUSTOMER", terms=["Acme Corp", "Globex"])
+        text = "Invoices for ACME CORP and globex are late"
+        assert _matched(text, recognizer.analyze(text, ["CUSTOMER"])) == ["ACME CORP", "globex"]
+
+    def test_case_sensitive_match(self):
+        recognizer = DictionaryRecognizer("CUSTOMER", terms=["Globex"], case_sensitive=True)
+        text = "globex and Globex"
+        results = recognizer.analyze(text, ["CUSTOMER"])
+        assert [(r.start, r.end) for r in results] == [(11, 17)]
+
+    def test_whitespace_normalization_maps_back_to_original_offsets(self):
+        """Test that terms match across runs of whitespace and spans refer to the original text"""
+        recognizer = DictionaryRecognizer("PROJECT", terms=["Project   Blue  Bird"])
+        text = "Status of project\tblue\n\nbird: green"
+        results = recognizer.analyze(text, ["PROJECT"])
+        assert _matched(text, results) == ["project\tblue\n\nbird"]
+        assert results[0].entity_type == "PROJECT"
+
+    def test_word_boundaries(self):
+        recognizer = DictionaryRecognizer("ACCOUNT", terms=["ac123"])
+        text = "ac123 xac123 ac1234 (ac123)"
+        assert [(r.start, r.end) for r in recognizer.analyze(text, ["ACCOUNT"])] == [(0, 5), (21, 26)]
+
+    def test_terms_or_path_required(self, tmp_path: Path):
+        with pytest.raises(ValueError):
+            DictionaryRecognizer("CUSTOMER")
+        with pytest.raises(ValueError):
+            DictionaryRecognizer("CUSTOMER", terms=["a"], path=str(tmp_path / "terms.txt"))
+
+    def test_load_from_file_and_hot_reload(self, tmp_path: Path):
+        """Test that terms are read from a file and reloaded when the file changes"""
+        terms_file = tmp_path / "customers.txt"
+        terms_file.write_text("# customers\nInitech\n\nUmbrella\n", encoding="utf-8")
+        # reloads are triggered explicitly below
+        recognizer = DictionaryRecognizer("CUSTOMER", path=str(terms_file), reload_interval=3600)
+
+        text = "Initech, Umbrella and Hooli"
+        assert _matched(text, recognizer.analyze(text, ["CUSTOMER"])) == ["Initech", "Umbrella"]
+
+        terms_file.write_text("Hooli\n", encoding="utf-8")
+        stat = os.stat(terms_file)
+        os.utime(terms_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        # the new automaton is built in the background, analysis keeps using the previous one meanwhile
+        reload_thread = recognizer.terms_file.reload_in_background()
+        assert reload_thread is not None
+        reload_thread.join()
+        assert _matched(text, recognizer.analyze(text, ["CUSTOMER"])) == ["Hooli"]
+        assert recognizer.terms_file.reload_if_changed() is False
+
+    def test_analyze_does_not_wait_for_reload(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+        """Test that a slow rebuild of the automaton does not block analysis"""
+        terms_file = tmp_path / "customers.txt"
+        terms_file.write_text("Initech\n", encoding="utf-8")
+        recognizer = DictionaryRecognizer("CUSTOMER", path=str(terms_file), reload_interval=0)
+        build_started = threading.Event()
+        release_build = threading.Event()
+
+        def slow_load(path):
+            build_started.set()
+            release_build.wait(5)
+            return AhoCorasickAutomaton(["hooli"])
+        monkeypatch.setattr(recognizer.terms_file, "load", slow_load)
+        terms_file.write_text("Hooli\n", encoding="utf-8")
+
+        text = "Initech and Hooli"
+        assert _matched(text, recognizer.analyze(text, ["CUSTOMER"])) == ["Initech"]
+        assert build_started.wait(5)
+        assert _matched(text, recognizer.analyze(text, ["CUSTOMER"])) == ["Initech"]
+        release_build.set()
+        recognizer.terms_file.wait_for_reload()
+        assert _matched(text, recognizer.analyze(text, ["CUSTOMER"])) == ["Hooli"]
+
+    def test_automaton_cache(self, tmp_path: Path):
+        """Test that automatons are shared in process and persisted to the cache directory"""
+        terms_file = tmp_path / "codenames.txt"
+        terms_file.write_text("Bluebird\nRedfox\n", encoding="utf-8")
+        cache_dir = tmp_path / "cache"
+
+        first = load_automaton(str(terms_file), cache_dir=str(cache_dir))
+        assert load_automaton(str(terms_file), cache_dir=str(cache_dir)) is first
+        assert len(list(cache_dir.glob("*.automaton.json"))) == 1
+
+        recognizer = DictionaryRecognizer("PROJECT", path=str(terms_file), cache_dir=str(cache_dir))
+        assert recognizer.automaton is first
+
+    def test_invalid_automaton_cache_file_is_rebuilt(self, tmp_path: Path):
+        """Test that an invalid cache file is ignored and rebuilt"""
+        terms_file = tmp_path / "codenames.txt"
+        terms_file.write_text("Bluebird\n", encoding="utf-8")
+        cache_dir = tmp_path / "cache"
+        load_automaton(str(terms_file), cache_dir=str(cache_dir))
+        cache_file = next(cache_dir.glob("*.automaton.json"))
+        cache_file.write_text('{"goto": [{"b": 7}], "fail": [0], "term_length": [0], "output_link": [0], "size": 1}')
+        # a new mtime, so that the automaton is not taken from the in-process cache
+        stat = os.stat(terms_file)
+        os.utime(terms_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        automaton = load_automaton(str(terms_file), cache_dir=str(cache_dir))
+        assert list(automaton.iter_matches("a bluebird")) == [(2, 10)]
+        assert list(AhoCorasickAutomaton.from_json(cache_file.read_text()).iter_matches("a bluebird")) == [(2, 10)]
+        with pytest.raises(ValueError):
+            AhoCorasickAutomaton.from_json("[]")
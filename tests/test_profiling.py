@@ -0,0 +1,85 @@
+import threading
+import time
+import pytest
+from presidio_analyzer import AnalyzerEngine
+from openai_anonymizer.anonymizer import OpenAIPayloadAnonymizer
+from openai_anonymizer.profiling import Profiler, DETERMINISTIC, SAMPLING
+
+class TestProfiler:
+    @pytest.fixture
+    def profiler(self):
+        profiler = Profiler()
+        yield profiler
+        profiler.stop()
+
+    def test_idle_profiler_runs_function_directly(self, profiler: Profiler):
+        assert profiler.session is None
+        assert profiler.call("noop", lambda x: x + 1, 1) == 2
+
+    def test_deterministic_session_stops_after_requests(self, profiler: Profiler, analyzer: AnalyzerEngine):
+        """Test that the per-recognizer breakdown and pstats are collected for the next N requests"""
+        anonymizer = OpenAIPayloadAnonymizer(analyzer=analyzer)
+        profiler.start(analyzer, mode=DETERMINISTIC, requests=2)
+
+        for _ in range(2):
+            profiler.call("anonymize_text", anonymizer.anonymize_text, "server ip is 10.0.0.1")
+            profiler.request_finished()
+
+        assert profiler.session is None
+        session = profiler.last_session
+        assert session is not None and session.finished
+        summary = session.summary()
+        assert summary["requests_profiled"] == 2
+        assert summary["breakdown"]["anonymize_text"]["calls"] == 2
+        assert any(name.startswith("recognizer:CustomIpRecognizer[IP_ADDRESS]") for name in summary["breakdown"])
+        assert any(name.startswith("nlp:") for name in summary["breakdown"])
+        assert session.pstats_dump()
+
+    def test_instrumentation_is_removed(self, profiler: Profiler, analyzer: AnalyzerEngine):
+        profiler.start(analyzer, mode=DETERMINISTIC)
+        profiler.stop()
+
+        for recognizer in analyzer.registry.recognizers:
+            assert "analyze" not in recognizer.__dict__
+        assert "process_text" not in analyzer.nlp_engine.__dict__
+
+    def test_sampling_session_collects_folded_stacks(self, profiler: Profiler, analyzer: AnalyzerEngine):
+        """Test that only the threads working inside Profiler.call() are sampled"""
+        def busy_work(seconds: float) -> None:
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                pass
+
+        idle = threading.Event()
+        idle_thread = threading.Thread(target=idle.wait, args=(5,))
+        idle_thread.start()
+        session = profiler.start(analyzer, mode=SAMPLING, seconds=5, sample_interval=0.001)
+        try:
+            profiler.call("busy", busy_work, 0.1)
+            # waiting inside call() (e.g. for the scheduler) is not sampled either
+            profiler.call("waiting", idle.wait, 0.05)
+        finally:
+            profiler.stop()
+            idle.set()
+            idle_thread.join()
+
+        assert session.samples > 0
+        lines = session.folded().splitlines()
+        assert lines
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            assert ";" in stack and int(count) > 0
+            assert stack.split(";")[-1].startswith("busy_work")
+        assert session.pstats_dump() is None
+
+    def test_only_one_session_at_a_time(self, profiler: Profiler, analyzer: AnalyzerEngine):
+        profiler.start(analyzer, mode=DETERMINISTIC)
+        with pytest.raises(RuntimeError):
+            profiler.start(analyzer)
+
+    def test_invalid_session(self, profiler: Profiler, analyzer: AnalyzerEngine):
+        with pytest.raises(ValueError):
+            profiler.start(analyzer, mode="unknown")
+        with pytest.raises(ValueError):
+            profiler.start(analyzer, requests=0)
+        assert profiler.session is None
@@ -0,0 +1,82 @@
+import threading
+from typing import List
+import pytest
+from presidio_analyzer import AnalyzerEngine
+from openai_anonymizer.anonymizer import OpenAIPayloadAnonymizer, SCORE_THRESHOLD
+from openai_anonymizer.scheduler import AnalysisScheduler
+from openai_anonymizer.selection import AnalysisPlan
+
+class TestAnalysisScheduler:
+    @pytest.fixture
+    def scheduler(self, analyzer: AnalyzerEngine):
+        scheduler = AnalysisScheduler(analyzer, max_batch_size=64, max_wait_ms=50, score_threshold=SCORE_THRESHOLD)
+        yield scheduler
+        scheduler.close()
+
+    def test_results_match_direct_analysis(self, analyzer: AnalyzerEngine, scheduler: AnalysisScheduler):
+        """Test that batched analysis returns the same spans as a direct analyze call"""
+        text = "Contact alice@example.com from 10.0.0.1"
+        expected = analyzer.analyze(text=text, language="en", score_threshold=SCORE_THRESHOLD)
+
+        assert sorted(scheduler.analyze(text), key=lambda r: r.start) == sorted(expected, key=lambda r: r.start)
+
+    def test_concurrent_texts_are_batched(self, scheduler: AnalysisScheduler):
+        """Test that texts from concurrent callers share batches and each caller gets its own spans"""
+        results: dict[int, List[str]] = {}
+
+        def analyze(i: int):
+            text = f"mail user{i}@example.com"
+            results[i] = [text[r.start:r.end] for r in scheduler.analyze(text)]
+
+        threads = [threading.Thread(target=analyze, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i in range(10):
+            assert f"user{i}@example.com" in results[i]
+        metrics = scheduler.metrics.snapshot()
+        assert metrics["texts"] == 10
+        assert metrics["batches"] < 10
+
+    def test_batch_size_is_capped(self, analyzer: AnalyzerEngine):
+        """Test that a large submission is split into batches of at most max_batch_size"""
+        scheduler = AnalysisScheduler(analyzer, max_batch_size=4, max_wait_ms=0)
+        try:
+            results = scheduler.analyze_many(["ip 10.0.0.1"] * 10)
+        finally:
+            scheduler.close()
+
+        assert len(results) == 10
+        distribution = scheduler.metrics.snapshot()["batch_size_distribution"]
+        assert sum(count for label, count in distribution.items() if label not in ("<=1", "<=2", "<=4")) == 0
+
+    def test_batches_are_analyzed_in_process(self, analyzer: AnalyzerEngine, monkeypatch):
+        """Test that micro-batches never start spaCy worker processes"""
+        calls = []
+        original = AnalysisPlan.analyze_batch
+        def analyze_batch(plan, texts, **kwargs):
+            calls.append(kwargs.pop("n_process"))
+            return original(plan, texts, **kwargs)
+        monkeypatch.setattr(AnalysisPlan, "analyze_batch", analyze_batch)
+        scheduler = AnalysisScheduler(analyzer, max_wait_ms=0)
+        try:
+            scheduler.analyze_many(["ip 10.0.0.1"])
+        finally:
+            scheduler.close()
+
+        assert calls == [1]
+
+    def test_anonymizer_uses_scheduler(self, analyzer: AnalyzerEngine, scheduler: AnalysisScheduler):
+        """Test that the anonymizer delegates analysis to the scheduler"""
+        anonymizer = OpenAIPayloadAnonymizer(analyzer=analyzer, scheduler=scheduler)
+
+        assert anonymizer.anonymize_text("Contact alice@example.com").text == "Contact <EMAIL_ADDRESS_0>"
+        assert scheduler.metrics.snapshot()["texts"] == 1
+
+    def test_invalid_settings(self, analyzer: AnalyzerEngine):
+        with pytest.raises(ValueError):
+            AnalysisScheduler(analyzer, max_batch_size=0)
+        with pytest.raises(ValueError):
+            AnalysisScheduler(analyzer, max_wait_ms=-1)
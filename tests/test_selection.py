@@ -0,0 +1,61 @@
+from typing import Any
+import pytest
+from presidio_analyzer import AnalyzerEngine
+from openai_anonymizer.anonymizer import OpenAIPayloadAnonymizer, SCORE_THRESHOLD
+from openai_anonymizer.selection import AnalysisPlan, RecognizerSelector, parse_entities
+
+class TestRecognizerSelection:
+    def test_parse_entities(self):
+        assert parse_entities(None) is None
+        assert parse_entities(" , ") is None
+        assert parse_entities("email_address, PHONE_NUMBER") == frozenset({"EMAIL_ADDRESS", "PHONE_NUMBER"})
+
+    def test_plan_runs_only_matching_recognizers(self, analyzer: AnalyzerEngine):
+        plan = AnalysisPlan(analyzer, frozenset({"EMAIL_ADDRESS", "PHONE_NUMBER"}))
+
+        for recognizer in plan.recognizers:
+            assert {"EMAIL_ADDRESS", "PHONE_NUMBER"} & set(recognizer.supported_entities)
+        assert plan.needs_nlp is False
+        assert AnalysisPlan(analyzer, frozenset({"PERSON"})).needs_nlp is True
+        assert AnalysisPlan(analyzer).needs_nlp is True
+
+    def test_nlp_pipeline_is_skipped(self, analyzer: AnalyzerEngine, monkeypatch: pytest.MonkeyPatch):
+        """Test that pattern-only plans never run the spaCy pipeline and filter the other entities"""
+        def fail(*args: Any, **kwargs: Any):
+            raise AssertionError("NLP pipeline should not run")
+        monkeypatch.setattr(analyzer.nlp_engine, "process_text", fail)
+        monkeypatch.setattr(analyzer.nlp_engine, "process_batch", fail)
+        plan = AnalysisPlan(analyzer, frozenset({"EMAIL_ADDRESS"}))
+
+        text = "Mail alice@example.com from 10.0.0.1"
+        results = plan.analyze(text, score_threshold=SCORE_THRESHOLD)
+        assert [(r.entity_type, text[r.start:r.end]) for r in results] == [("EMAIL_ADDRESS", "alice@example.com")]
+        assert [len(r) for r in plan.analyze_batch([text, "nothing here"], score_threshold=SCORE_THRESHOLD)] == [1, 0]
+
+    def test_anonymizer_with_plan(self, analyzer: AnalyzerEngine):
+        plan = RecognizerSelector(analyzer).plan(["IP_ADDRESS"])
+        anonymizer = OpenAIPayloadAnonymizer(analyzer=analyzer, plan=plan)
+
+        anonymized = anonymizer.anonymize_text("Mail alice@example.com from 10.0.0.1")
+        assert anonymized.text == "Mail alice@example.com from <IP_ADDRESS_0>"
+
+    def test_plans_are_cached(self, analyzer: AnalyzerEngine):
+        selector = RecognizerSelector(analyzer)
+
+        assert selector.plan(["EMAIL_ADDRESS", "PHONE_NUMBER"]) is selector.plan(["PHONE_NUMBER", "EMAIL_ADDRESS"])
+        assert selector.plan() is selector.plan(None)
+        assert selector.plan().analyzer is analyzer
+
+    def test_unsupported_entities(self, analyzer: AnalyzerEngine):
+        with pytest.raises(ValueError):
+            RecognizerSelector(analyzer).plan(["NOT_AN_ENTITY"])
+
+    def test_least_recently_used_plans_are_evicted(self, analyzer: AnalyzerEngine):
+        selector = RecognizerSelector(analyzer, max_plans=2)
+        email = selector.plan(["EMAIL_ADDRESS"])
+        selector.plan(["IP_ADDRESS"])
+        assert selector.plan(["EMAIL_ADDRESS"]) is email
+
+        selector.plan(["USERNAME"])
+        assert selector.plan(["EMAIL_ADDRESS"]) is email
+        assert frozenset({"IP_ADDRESS"}) not in selector._plans
@@ -0,0 +1,69 @@
+import os
+import sys
+import pytest
+from openai_anonymizer.server import MAX_RESTART_DELAY, PreforkServer, format_memory_report, memory_usage, restart_delay
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="requires /proc/<pid>/smaps_rollup")
+def test_memory_usage_of_current_process():
+    usage = memory_usage(os.getpid())
+
+    assert usage is not None
+    assert 0 < usage["uss"] <= usage["rss"]
+    assert 0 < usage["pss"] <= usage["rss"]
+
+def test_memory_usage_of_missing_process():
+    assert memory_usage(-1) is None
+    assert "n/a" in format_memory_report([-1])
+
+class CrashingWorkers:
+    """Fake workers that all exit as soon as they are started"""
+    def __init__(self, server: PreforkServer):
+        self.server = server
+        self.now = 0.0
+        self.next_pid = 100
+        server._clock = lambda: self.now
+        server._spawn = self.spawn
+
+    def spawn(self, sock):
+        self.next_pid += 1
+        return self.next_pid
+
+    def waitpid(self, pid, options):
+        return pid, 1 << 8
+
+def test_restart_delay():
+    assert restart_delay(0) == 0
+    assert restart_delay(1) < restart_delay(2) < restart_delay(3)
+    assert restart_delay(100) == MAX_RESTART_DELAY
+
+def test_crashing_workers_are_restarted_with_backoff_then_master_exits(monkeypatch):
+    server = PreforkServer("127.0.0.1", 0, workers=1, memory_report_interval=0, max_restarts=4, restart_window=60)
+    workers = CrashingWorkers(server)
+    monkeypatch.setattr(os, "waitpid", workers.waitpid)
+    server.children = [workers.spawn(None)]
+
+    restarted_at = []
+    while not server.should_exit:
+        spawned = workers.next_pid
+        server._reap(None)
+        if workers.next_pid != spawned:
+            restarted_at.append(workers.now)
+        workers.now += 0.5
+
+    # each crash is noticed on the next tick, then waits 0, 0.5, 1 and 2 seconds
+    assert restarted_at == [0.0, 1.0, 2.5, 5.0]
+    assert server.exit_code == 1
+    assert server.children == []
+
+def test_restarts_are_counted_over_a_sliding_window(monkeypatch):
+    server = PreforkServer("127.0.0.1", 0, workers=1, memory_report_interval=0, max_restarts=2, restart_window=10)
+    workers = CrashingWorkers(server)
+    monkeypatch.setattr(os, "waitpid", workers.waitpid)
+
+    for _ in range(5):
+        server.children = [workers.spawn(None)]
+        server._reap(None)
+        assert server.children and not server.should_exit
+        workers.now += 11
+
+    assert server.exit_code == 0
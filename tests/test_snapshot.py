@@ -0,0 +1,75 @@
+import json
+import os
+import pytest
+from openai_anonymizer.config import settings
+from openai_anonymizer.snapshot import MANIFEST_FILE, REGISTRY_FILE, load_snapshot, save_snapshot
+
+TEXT = "John Doe lives in Madrid, his email is john.doe@example.com and his IP 192.168.0.1"
+
+def _spans(results):
+    return sorted((r.entity_type, r.start, r.end, round(r.score, 2)) for r in results)
+
+def test_snapshot_round_trip(analyzer, tmp_path):
+    path = str(tmp_path / "snapshot")
+    save_snapshot(analyzer, path)
+    loaded = load_snapshot(path)
+
+    assert len(loaded.registry.recognizers) == len(analyzer.registry.recognizers)
+    assert _spans(loaded.analyze(text=TEXT, language="en")) == _spans(analyzer.analyze(text=TEXT, language="en"))
+
+def test_snapshot_replaces_existing_directory(analyzer, tmp_path):
+    path = str(tmp_path / "snapshot")
+    save_snapshot(analyzer, path)
+    save_snapshot(analyzer, path)
+
+    assert os.listdir(tmp_path) == ["snapshot"]
+
+def test_snapshot_built_with_other_versions(analyzer, tmp_path):
+    path = str(tmp_path / "snapshot")
+    save_snapshot(analyzer, path)
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+    manifest["presidio-analyzer"] = "0.0.0"
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file)
+
+    with pytest.raises(ValueError):
+        load_snapshot(path)
+
+def test_snapshot_built_with_other_dictionary_settings(analyzer, tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot")
+    terms_path = tmp_path / "terms.txt"
+    terms_path.write_text("Zorblax\n")
+    save_snapshot(analyzer, path)
+
+    monkeypatch.setattr(settings, "dictionary_files", {"CUSTOMER": str(terms_path)})
+    with pytest.raises(ValueError):
+        load_snapshot(path)
+
+    save_snapshot(analyzer, path)
+    load_snapshot(path)
+    terms_path.write_text("Zorblax\nQuux\n")
+    with pytest.raises(ValueError):
+        load_snapshot(path)
+
+@pytest.mark.parametrize("name, value", [("dictionary_reload_interval", 60.0), ("dictionary_cache_dir", "/var/cache/automatons")])
+def test_snapshot_built_with_other_dictionary_reload_settings(analyzer, tmp_path, monkeypatch, name, value):
+    path = str(tmp_path / "snapshot")
+    save_snapshot(analyzer, path)
+
+    monkeypatch.setattr(settings, name, value)
+    with pytest.raises(ValueError):
+        load_snapshot(path)
+
+def test_truncated_snapshot(analyzer, tmp_path):
+    path = str(tmp_path / "snapshot")
+    save_snapshot(analyzer, path)
+    registry_path = os.path.join(path, REGISTRY_FILE)
+    with open(registry_path, "rb") as file:
+        registry = file.read()
+    with open(registry_path, "wb") as file:
+        file.write(registry[:len(registry) // 2])
+
+    with pytest.raises(ValueError):
+        load_snapshot(path)
@@ -0,0 +1,122 @@
+import os
+import pytest
+from presidio_analyzer import AnalyzerEngine
+from openai_anonymizer.anonymizer import OpenAIPayloadAnonymizer
+from openai_anonymizer.tenants import TenantConfigurationError, TenantRegistryCache, compile_tenant_config
+
+ACME_CONFIG = """
+score_threshold: 0.8
+recognizers:
+  - supported_entity: EMPLOYEE_ID
+    patterns:
+      - {name: employee_id, regex: '\\bEMP-\\d{6}\\b', score: 0.85}
+    context: [employee, badge]
+  - supported_entity: USERNAME
+    patterns:
+      - {name: acme_login, regex: '\\bacme-[a-z]+\\b', score: 0.9}
+"""
+
+def _write(path, content: str) -> str:
+    path.write_text(content)
+    return str(path)
+
+def _entities(results, text: str):
+    return sorted((r.entity_type, text[r.start:r.end]) for r in results)
+
+class TestTenantRegistries:
+    def test_tenant_recognizers_and_threshold(self, analyzer: AnalyzerEngine, tmp_path):
+        cache = TenantRegistryCache(analyzer, {"acme": _write(tmp_path / "acme.yaml", ACME_CONFIG)})
+        registry = cache.get("acme")
+
+        assert registry is not None
+        assert registry.analyzer.nlp_engine is analyzer.nlp_engine
+        plan = registry.selector.plan(["EMPLOYEE_ID", "USERNAME"])
+        assert plan.score_threshold == 0.8
+        text = "Badge EMP-123456 of acme-alice, also known as bob123"
+        # the tenant USERNAME recognizer replaces the built-in one (which would match bob123)
+        assert _entities(plan.analyze(text, plan.score_threshold), text) == [
+            ("EMPLOYEE_ID", "EMP-123456"), ("USERNAME", "acme-alice")
+        ]
+
+    def test_anonymizer_uses_tenant_threshold(self, analyzer: AnalyzerEngine, tmp_path):
+        path = _write(tmp_path / "strict.json", '{"score_threshold": 1.0}')
+        plan = TenantRegistryCache(analyzer, {"strict": path}).get("strict").selector.plan(["IP_ADDRESS"])
+        anonymizer = OpenAIPayloadAnonymizer(analyzer=analyzer, plan=plan)
+
+        assert anonymizer.score_threshold == 1.0
+        # the IP address patterns score 0.9
+        assert anonymizer.anonymize_text("From 10.0.0.1").text == "From 10.0.0.1"
+
+    def test_unknown_tenant(self, analyzer: AnalyzerEngine):
+        cache = TenantRegistryCache(analyzer, {})
+
+        assert cache.get("other") is None
+        assert cache.get(None) is None
+
+    def test_identical_configurations_share_a_registry(self, analyzer: AnalyzerEngine, tmp_path):
+        cache = TenantRegistryCache(analyzer, {
+            "acme": _write(tmp_path / "acme.yaml", ACME_CONFIG),
+            "acme-eu": _write(tmp_path / "acme-eu.yaml", "# same as acme\n" + ACME_CONFIG),
+        })
+
+        assert cache.get("acme") is cache.get("acme-eu")
+
+    def test_least_recently_used_registries_are_evicted(self, analyzer: AnalyzerEngine, tmp_path):
+        cache = TenantRegistryCache(analyzer, {
+            "a": _write(tmp_path / "a.yaml", "score_threshold: 0.5"),
+            "b": _write(tmp_path / "b.yaml", "score_threshold: 0.7"),
+        }, max_registries=1)
+        registry = cache.get("a")
+        cache.get("b")
+
+        assert cache.get("a") is not registry
+        assert cache.get("a").score_threshold == 0.5
+
+    def test_hot_reload(self, analyzer: AnalyzerEngine, tmp_path):
+        path = _write(tmp_path / "acme.yaml", "score_threshold: 0.5")
+        # reloads are triggered explicitly below
+        cache = TenantRegistryCache(analyzer, {"acme": path}, reload_interval=3600)
+        assert cache.get("acme").score_threshold == 0.5
+
+        def get_after_reload():
+            # the new version is compiled in the background, requests keep the previous one meanwhile
+            cache._tenants["acme"].reload_in_background().join()
+            return cache.get("acme")
+
+        _write(tmp_path / "acme.yaml", "score_threshold: 0.75")
+        assert get_after_reload().score_threshold == 0.75
+
+        # an invalid version is ignored until the file is fixed
+        _write(tmp_path / "acme.yaml", "score_threshold: 7.5")
+        assert get_after_reload().score_threshold == 0.75
+        os.remove(path)
+        assert get_after_reload().score_threshold == 0.75
+
+    def test_invalid_configuration_at_startup(self, analyzer: AnalyzerEngine, tmp_path):
+        """Test that a tenant with an invalid file fails alone, until its file is fixed"""
+        path = _write(tmp_path / "acme.yaml", "threshold: 0.5")
+        cache = TenantRegistryCache(analyzer, {
+            "acme": path,
+            "globex": str(tmp_path / "missing.yaml"),
+            "initech": _write(tmp_path / "initech.yaml", "score_threshold: 0.5"),
+        }, reload_interval=3600)
+
+        assert cache.invalid_tenants() == ["acme", "globex"]
+        for tenant in ("acme", "globex"):
+            with pytest.raises(TenantConfigurationError):
+                cache.get(tenant)
+        assert cache.get("initech").score_threshold == 0.5
+        assert cache.get("other") is None
+
+        _write(tmp_path / "acme.yaml", "score_threshold: 0.75")
+        cache._tenants["acme"].reload_in_background().join()
+        assert cache.get("acme").score_threshold == 0.75
+        assert cache.invalid_tenants() == ["globex"]
+
+    def test_invalid_configurations(self, analyzer: AnalyzerEngine, tmp_path):
+        with pytest.raises(ValueError):
+            compile_tenant_config(analyzer, {"recognizers": [{"supported_entity": "X", "patterns": [{"name": "x"}]}]})
+        with pytest.raises(ValueError):
+            compile_tenant_config(analyzer, {"recognizers": [
+                {"supported_entity": "X", "patterns": [{"name": "x", "regex": "(", "score": 0.5}]}
+            ]})
@@ -0,0 +1,94 @@
+import os
+import pickle
+import threading
+from openai_anonymizer.watch import WatchedFile, reload_all, reset_after_fork
+
+def _touch(path, content: str) -> None:
+    """Write content with a new mtime, even within the timestamp resolution of the filesystem"""
+    previous = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    path.write_text(content)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, max(stat.st_mtime_ns, previous + 1_000_000_000)))
+
+def _read_int(path: str) -> int:
+    with open(path) as file:
+        return int(file.read())
+
+def test_reload_in_background_keeps_previous_value_until_loaded(tmp_path):
+    path = tmp_path / "value.txt"
+    _touch(path, "1")
+    watched = WatchedFile(str(path), _read_int, reload_interval=3600)
+    assert watched.get() == 1
+
+    _touch(path, "2")
+    assert watched.get() == 1
+    watched.reload_in_background().join()
+    assert watched.get() == 2
+    assert watched.reload_if_changed() is False
+
+def test_invalid_versions_are_kept_until_fixed(tmp_path):
+    path = tmp_path / "value.txt"
+    path.write_text("x")
+    loads = []
+    def load(p):
+        loads.append(p)
+        return _read_int(p)
+    watched = WatchedFile(str(path), load, reload_interval=0)
+    assert watched.value is None and isinstance(watched.error, ValueError)
+
+    _touch(path, "3")
+    assert watched.reload_if_changed() is True
+    assert watched.value == 3 and watched.error is None
+
+    _touch(path, "y")
+    assert watched.reload_if_changed() is False
+    assert watched.value == 3 and isinstance(watched.error, ValueError)
+    # not retried until the file changes again
+    assert watched.reload_if_changed() is False
+    assert len(loads) == 3
+
+def test_pickled_file_is_checked_on_first_use(tmp_path):
+    path = tmp_path / "value.txt"
+    _touch(path, "1")
+    watched = pickle.loads(pickle.dumps(WatchedFile(str(path), _read_int, reload_interval=3600)))
+    _touch(path, "2")
+
+    assert watched.get() in (1, 2)
+    watched.wait_for_reload()
+    assert watched.value == 2
+
+def test_reload_all_finishes_background_reloads(tmp_path):
+    """Test that no reload is running (nor any reload lock held) once reload_all() returns, as before a fork"""
+    path = tmp_path / "value.txt"
+    _touch(path, "1")
+    watched = WatchedFile(str(path), _read_int, reload_interval=3600)
+    load_started = threading.Event()
+    release_load = threading.Event()
+    def slow_load(p):
+        load_started.set()
+        release_load.wait(5)
+        return _read_int(p)
+    watched.load = slow_load
+    _touch(path, "2")
+    watched.reload_in_background()
+    assert load_started.wait(5)
+
+    threading.Timer(0.05, release_load.set).start()
+    _touch(path, "3")
+    reload_all()
+    assert watched.value == 3
+    assert not watched._reload_lock.locked()
+
+def test_reset_after_fork(tmp_path):
+    path = tmp_path / "value.txt"
+    _touch(path, "1")
+    watched = WatchedFile(str(path), _read_int, reload_interval=3600)
+    watched._reload_lock.acquire()
+
+    reset_after_fork()
+    assert not watched._reload_lock.locked()
+    _touch(path, "2")
+    watched.get()
+    watched.wait_for_reload()
+    assert watched.value == 2
+